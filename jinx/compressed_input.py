@@ -0,0 +1,279 @@
+import bisect
+import bz2
+import functools
+import gzip
+import json
+import lzma
+import os
+import re
+import struct
+import threading
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b"
+BZIP2_MAGIC = b"BZh"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+COMPRESSED_EXTENSIONS = (".gz", ".bgz", ".bz2", ".xz")
+
+# BGZF files are gzip files made of blocks of at most 64 kB, each with its size in a "BC" extra field
+BGZF_HEADER_SIZE = 18
+BGZF_FOOTER_SIZE = 8
+BGZF_INDEX_VERSION = 1
+
+RECORD_START = re.compile(rb"^LOCUS", re.MULTILINE)
+RECORD_END = b"\n//"
+
+
+def _compression(header):
+    if header.startswith(GZIP_MAGIC):
+        if len(header) == BGZF_HEADER_SIZE and header[3] & 4 and header[12:14] == b"BC":
+            return "bgzf"
+        return "gzip"
+    if header.startswith(BZIP2_MAGIC):
+        return "bz2"
+    if header.startswith(XZ_MAGIC):
+        return "xz"
+    return None
+
+
+def compression(path):
+    """
+    Return how a file is compressed ("gzip", "bgzf", "bz2" or "xz"), or None if it isn't
+    """
+    with open(path, "rb") as handle:
+        return _compression(handle.read(BGZF_HEADER_SIZE))
+
+
+def decompressed(raw):
+    """
+    Wrap a binary file object so that it is transparently decompressed while reading
+    """
+    kind = _compression(raw.read(BGZF_HEADER_SIZE))
+    raw.seek(0)
+
+    if kind in ("gzip", "bgzf"):
+        return gzip.GzipFile(fileobj=raw)
+    if kind == "bz2":
+        return bz2.BZ2File(raw)
+    if kind == "xz":
+        return lzma.LZMAFile(raw)
+    return raw
+
+
+def _bgzf_blocks(raw):
+    """
+    Yield (block offset, uncompressed data) for the blocks of a BGZF file, from the current position on
+    """
+    while header := raw.read(BGZF_HEADER_SIZE):
+        if len(header) < BGZF_HEADER_SIZE or header[12:14] != b"BC":
+            raise ValueError(f"Invalid BGZF block at offset {raw.tell() - len(header)}")
+
+        block_size, = struct.unpack_from("<H", header, 16)
+        deflated = raw.read(block_size + 1 - BGZF_HEADER_SIZE)
+        yield raw.tell() - block_size - 1, zlib.decompress(deflated[:-BGZF_FOOTER_SIZE], wbits=-15)
+
+
+def _chunks(raw, kind, start, index=None, chunk_size=2**20):
+    """
+    Yield (uncompressed data, compressed bytes read) from the uncompressed offset start on.
+    BGZF blocks are also recorded in the index, if one is being built.
+    """
+    if kind == "bgzf":
+        skip = 0
+        if start:
+            block_offset, data_offset = bgzf_index(raw.name).block(start)
+            raw.seek(block_offset)
+            skip = start - data_offset
+
+        data_offset = start - skip
+        for block_offset, data in _bgzf_blocks(raw):
+            if index is not None:
+                index.add_block(block_offset, data_offset)
+            data_offset += len(data)
+            yield data[skip:], raw.tell()
+            skip = 0
+        return
+
+    handle = decompressed(raw)
+    # Only BGZF files can be entered anywhere, the others are inflated up to the start
+    handle.seek(start)
+    while data := handle.read(chunk_size):
+        yield data, raw.tell()
+
+
+def iter_records(path, start=0, end=None):
+    """
+    Split the content of a compressed genbank file into records, from their LOCUS line up to and including their // line.
+    Yields (uncompressed offset, record, compressed bytes read) for the records starting in [start, end).
+    Reading a BGZF file from start to end also saves its index.
+    """
+    with open(path, "rb") as raw:
+        kind = _compression(raw.read(BGZF_HEADER_SIZE))
+        raw.seek(0)
+
+        index = BgzfIndex() if kind == "bgzf" and start == 0 and end is None else None
+        yield from _iter_records(raw, kind, start, end, index)
+
+    if index is not None:
+        index.save(path)
+
+
+def _iter_records(raw, kind, start, end, index):
+    """
+    Records of an open compressed file, adding the blocks and records to the index if one is being built
+    """
+    pending, pending_offset, searched = bytearray(), start, 0
+    for data, bytes_read in _chunks(raw, kind, start, index):
+        pending += data
+
+        while (record_end := pending.find(RECORD_END, searched)) != -1:
+            line_end = pending.find(b"\n", record_end + 1)
+            if line_end == -1:
+                # The // line is not complete yet
+                searched = record_end
+                break
+
+            record_start = RECORD_START.search(pending, 0, record_end)
+            if record_start is not None:
+                if end is not None and pending_offset + record_start.start() >= end:
+                    return
+                if index is not None:
+                    index.add_record(pending_offset + record_start.start())
+                yield pending_offset + record_start.start(), bytes(pending[record_start.start():line_end + 1]), bytes_read
+
+            del pending[:line_end + 1]
+            pending_offset += line_end + 1
+            searched = 0
+        else:
+            searched = max(len(pending) - len(RECORD_END), 0)
+
+    # The last record may lack its // line
+    record_start = RECORD_START.search(pending)
+    if record_start is not None and (end is None or pending_offset + record_start.start() < end):
+        if index is not None:
+            index.add_record(pending_offset + record_start.start())
+        yield pending_offset + record_start.start(), bytes(pending[record_start.start():]), raw.tell()
+
+
+class BgzfIndex:
+    """
+    Where the blocks and records of a BGZF file start, so that any part of it can be read
+    without inflating what comes before. It is stored in a sidecar file next to the genbank file.
+    Records are located by virtual offsets like in samtools and Biopython:
+    the offset of their block in the file shifted by 16 bits, plus their offset in the uncompressed block.
+    """
+
+    def __init__(self, block_offsets=(), data_offsets=(), record_offsets=()):
+        self.block_offsets = list(block_offsets)
+        self.data_offsets = list(data_offsets)
+        self.record_offsets = list(record_offsets)
+
+    def add_block(self, block_offset, data_offset):
+        self.block_offsets.append(block_offset)
+        self.data_offsets.append(data_offset)
+
+    def add_record(self, offset):
+        self.record_offsets.append(offset)
+
+    def block(self, offset):
+        """
+        Return (block offset, uncompressed offset of the block) of the block containing an uncompressed offset
+        """
+        i = max(bisect.bisect_right(self.data_offsets, offset) - 1, 0)
+        return self.block_offsets[i], self.data_offsets[i]
+
+    def virtual_offset(self, offset):
+        block_offset, data_offset = self.block(offset)
+        return block_offset << 16 | offset - data_offset
+
+    def record_virtual_offsets(self):
+        return [self.virtual_offset(offset) for offset in self.record_offsets]
+
+    @staticmethod
+    def sidecar(path):
+        return f"{path}.jinx-index"
+
+    def save(self, path):
+        stat = os.stat(path)
+        try:
+            with open(self.sidecar(path), "w") as handle:
+                json.dump({
+                    "version": BGZF_INDEX_VERSION,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "blocks": [self.block_offsets, self.data_offsets],
+                    "records": [self.record_offsets, self.record_virtual_offsets()],
+                }, handle)
+        except OSError:
+            # Not being able to write next to the file is not an error, the index is just built again next time
+            pass
+
+    @classmethod
+    def load(cls, path):
+        """
+        Return the saved index of a BGZF file, or None if there is none or the file changed since
+        """
+        stat = os.stat(path)
+        try:
+            with open(cls.sidecar(path)) as handle:
+                saved = json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+        if (saved.get("version"), saved.get("size"), saved.get("mtime_ns")) != (BGZF_INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+            return None
+        return cls(*saved["blocks"], saved["records"][0])
+
+
+def bgzf_index(path):
+    """
+    Return the index of a BGZF file, building it if there is no valid one saved next to the file.
+    The saved index is only a cache: when it can't be written, the index built in memory is used.
+    """
+    stat = os.stat(path)
+    return _bgzf_index(path, stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=16)
+def _bgzf_index(path, size, mtime_ns):
+    # Keyed by the size and modification time of the file, so that a changed file is indexed again
+    index = BgzfIndex.load(path)
+    if index is None:
+        index = BgzfIndex()
+        with open(path, "rb") as raw:
+            for _ in _iter_records(raw, "bgzf", 0, None, index):
+                pass
+        index.save(path)
+    return index
+
+
+class CompressedBuffer:
+    """
+    Read-only access to the uncompressed content of a compressed file by slicing, like a memory mapped plain file.
+    BGZF files are entered at the closest block, other files are inflated from their start (or from the last read) on.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.kind = compression(path)
+        self.index = bgzf_index(path) if self.kind == "bgzf" else None
+        self._raw = open(path, "rb")
+        self._handle = decompressed(self._raw)
+        # Sequences may be read from several threads, but the file has a single position
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        start, stop = key.start or 0, key.stop
+        with self._lock:
+            if self.index is not None:
+                block_offset, data_offset = self.index.block(start)
+                data = bytearray()
+                self._raw.seek(block_offset)
+                for _, block in _bgzf_blocks(self._raw):
+                    data += block
+                    if stop is not None and data_offset + len(data) >= stop:
+                        break
+                return bytes(data[start - data_offset:None if stop is None else stop - data_offset])
+
+            self._handle.seek(start)
+            return self._handle.read() if stop is None else self._handle.read(max(stop - start, 0))
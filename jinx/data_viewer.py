@@ -1,82 +1,348 @@
 
 from textual.widgets import Static, Markdown, DataTable, Input, ContentSwitcher
+from textual.widgets.data_table import RowKey
+from textual._two_way_dict import TwoWayDict
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.geometry import Size
+from textual.reactive import reactive
+from textual.binding import Binding
 from textual.containers import Horizontal, VerticalScroll
 from textual.message import Message
+from textual import work
+from textual.worker import get_current_worker
+
+from rich.segment import Segment
+
+import numpy as np
+import pandas as pd
+
+from parsers import format_qualifiers, format_record_annotations
+from locus_index import LocusIndex
+
+class FeatureTable(DataTable):
+    """
+    DataTable with one row per feature, keyed by the feature id (the index of the feature table).
+    Showing a new set of features only adds and removes the rows which changed,
+    so that scrolling through features doesn't rebuild the whole table.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Values of the row keys, to work out which features entered or left without asking every row
+        self.feature_keys = set()
+
+    def show_features(self, features, columns):
+        cursor_key = None
+        if self.row_count:
+            cursor_key = self.coordinate_to_cell_key(self.cursor_coordinate).row_key
+
+        shown_keys = [str(feature_id) for feature_id in features.index]
+        removed = self.feature_keys.difference(shown_keys)
+        for key in removed:
+            row_key = RowKey(key)
+            del self.rows[row_key]
+            del self._data[row_key]
+            self._new_rows.discard(row_key)
+        if removed:
+            self._updated_cells = {cell for cell in self._updated_cells if cell.row_key in self.rows}
+
+        is_added = [key not in self.feature_keys for key in shown_keys]
+        self.append_features(features[is_added], columns)
+
+        # Rows in the order of the features, instead of one remove_row call per row which would renumber the whole table each time
+        self._row_locations = TwoWayDict({RowKey(key): i for i, key in enumerate(shown_keys)})
+        self.feature_keys = set(shown_keys)
+
+        self._require_update_dimensions = True
+        self._update_count += 1
+        self.cursor_coordinate = self.cursor_coordinate
+        self.hover_coordinate = self.hover_coordinate
+        self.refresh(layout=True)
+        self.check_idle()
+
+        # Keep the cursor on the same feature if it's still shown
+        if cursor_key is not None and cursor_key in self.rows:
+            self.move_cursor(row=self.get_row_index(cursor_key), scroll=False)
+
+    def append_features(self, features, columns):
+        """
+        Add rows for features after the ones shown
+        """
+        for feature_id, row in zip(features.index, features[columns].itertuples(index=False, name=None)):
+            self.add_row(*row, key=str(feature_id))
+            self.feature_keys.add(str(feature_id))
+
+    def clear(self, columns=False):
+        self.feature_keys = set()
+        return super().clear(columns)
+
 
 class FeatureQualifiers(Horizontal):
     DISPLAYED_COLUMNS = ["feature_type", "start", "end", "strand", "label"]
 
-    current_features = None
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # The shown features, in batches which are kept apart since concatenating them on every batch takes quadratic time
+        self.feature_batches = []
 
     def compose(self):
         yield Horizontal(
-            DataTable(cursor_type="row", classes="visible-features-data-table focus-highlight-background"),
+            FeatureTable(cursor_type="row", classes="visible-features-data-table focus-highlight-background"),
             VerticalScroll(Markdown("I am a Markdown", classes="visible-features-details"), classes="focus-highlight-background")
         ) 
 
     def on_mount(self) -> None:
         table = self.query_one(DataTable)
-        table.add_columns(*self.DISPLAYED_COLUMNS)
+        for column in self.DISPLAYED_COLUMNS:
+            # Keyed by name, so that rows can be sorted by column
+            table.add_column(column, key=column)
 
 
     def display_features(self, features):
-        table = self.query_one(DataTable)
-        table.clear()
-        self.current_features = features
-        table.add_rows(
-            list(features[self.DISPLAYED_COLUMNS].itertuples(index=False, name=None))
-        )
+        self.feature_batches = [features]
+        self.query_one(FeatureTable).show_features(features, self.DISPLAYED_COLUMNS)
+
+    def append_features(self, features):
+        self.feature_batches.append(features)
+        self.query_one(FeatureTable).append_features(features, self.DISPLAYED_COLUMNS)
+
+    def feature(self, feature_id):
+        """
+        Return the shown feature with the given id, or None if it's no longer shown
+        """
+        for batch in self.feature_batches:
+            if feature_id in batch.index:
+                return batch.loc[feature_id]
+        return None
 
     def on_data_table_row_highlighted(self, event):
+        # Highlight events are handled after the fact, by when the rows may have been replaced
+        feature = self.feature(int(event.row_key.value))
+        if feature is None:
+            return
+
         details_markdown = self.query_one(".visible-features-details")
+        details_markdown.update(format_qualifiers(feature.qualifiers))
         
-        details_markdown.update(
-            self.current_features.formatted_qualifiers.iloc[event.cursor_row]
+
+class SearchResults(FeatureQualifiers):
+    # Search results come from all loci
+    DISPLAYED_COLUMNS = ["locus"] + FeatureQualifiers.DISPLAYED_COLUMNS
+
+
+class LocusList(ScrollView, can_focus=True):
+    """
+    List of loci which only renders the rows on screen, from the columns of a LocusIndex.
+    The first line is a header which stays in place while the rows scroll.
+    """
+
+    COMPONENT_CLASSES = {
+        "locus-list--header",
+        "locus-list--cursor",
+    }
+    BINDINGS = [
+        Binding("up", "move_cursor(-1)", "Up", show=False),
+        Binding("down", "move_cursor(1)", "Down", show=False),
+        Binding("pageup", "move_page(-1)", "Page up", show=False),
+        Binding("pagedown", "move_page(1)", "Page down", show=False),
+        Binding("home", "first", "First", show=False),
+        Binding("end", "last", "Last", show=False),
+        Binding("enter", "select", "Select", show=False),
+        Binding("1", "sort('locus_id')", "Sort by id"),
+        Binding("2", "sort('name')", "Sort by name"),
+        Binding("3", "sort('sequence_length')", "Sort by length"),
+    ]
+    # Highlighting the same locus again (e.g. when the list is opened again) still updates the details
+    cursor = reactive(0, always_update=True)
+
+    def __init__(self, index, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        # Positions in the locus table of the listed loci, in the listed order
+        self.rows = np.empty(0, dtype=np.int64)
+        self.sort_column = None
+        self.descending = False
+        self.filter_query = ""
+        self.column_widths = {}
+
+    class Highlighted(Message):
+        def __init__(self, locus_index):
+            self.locus_index = locus_index
+            super().__init__()
+
+    class Selected(Message):
+        def __init__(self, locus_index):
+            self.locus_index = locus_index
+            super().__init__()
+
+    def update_rows(self):
+        """
+        List the loci of the index again, after it changed or the sorting or filter did
+        """
+        current_locus = self.current_locus_index()
+        self.rows = self.index.rows(self.sort_column, self.descending, self.filter_query)
+        # Room for the sorting arrow next to the column titles
+        self.column_widths = {column: max(self.index.column_width(column), len(column) + 2) for column in LocusIndex.COLUMNS}
+        self.virtual_size = Size(sum(self.column_widths.values()) + 2 * len(self.column_widths), len(self.rows) + 1)
+
+        # The cursor stays on the same locus if it is still listed
+        cursor = min(self.cursor, max(len(self.rows) - 1, 0))
+        if current_locus is not None:
+            position = np.flatnonzero(self.rows == current_locus)
+            cursor = int(position[0]) if len(position) else 0
+
+        if all(node.display for node in self.ancestors_with_self):
+            self.cursor = cursor
+        else:
+            # Loci are added to the hidden list while loading, which must not highlight (and warm up) anything.
+            # Opening the list moves the cursor to the current locus anyway.
+            self.set_reactive(LocusList.cursor, cursor)
+
+    def current_locus_index(self):
+        if not 0 <= self.cursor < len(self.rows):
+            return None
+        return int(self.rows[self.cursor])
+
+    def show_locus(self, locus_index):
+        position = np.flatnonzero(self.rows == locus_index)
+        if len(position):
+            self.cursor = int(position[0])
+
+    def watch_cursor(self, cursor):
+        self._scroll_to_cursor()
+        self.refresh()
+        locus_index = self.current_locus_index()
+        if locus_index is not None:
+            self.post_message(self.Highlighted(locus_index))
+
+    def _scroll_to_cursor(self):
+        visible_rows = max(self.size.height - 1, 1)
+        if self.cursor < self.scroll_offset.y:
+            self.scroll_to(y=self.cursor, animate=False)
+        elif self.cursor >= self.scroll_offset.y + visible_rows:
+            self.scroll_to(y=self.cursor - visible_rows + 1, animate=False)
+
+    def action_move_cursor(self, rows):
+        self.cursor = min(max(self.cursor + rows, 0), max(len(self.rows) - 1, 0))
+
+    def action_move_page(self, pages):
+        self.action_move_cursor(pages * max(self.size.height - 1, 1))
+
+    def action_first(self):
+        self.cursor = 0
+
+    def action_last(self):
+        self.cursor = max(len(self.rows) - 1, 0)
+
+    def action_select(self):
+        locus_index = self.current_locus_index()
+        if locus_index is not None:
+            self.post_message(self.Selected(locus_index))
+
+    def action_sort(self, column):
+        # Sorting by the same column again reverses the order
+        self.descending = not self.descending if column == self.sort_column else False
+        self.sort_column = column
+        self.update_rows()
+
+    def filter(self, query):
+        self.filter_query = query
+        self.update_rows()
+
+    def on_click(self, event):
+        row = event.y - 1 + self.scroll_offset.y
+        if event.y == 0 or not 0 <= row < len(self.rows):
+            return
+        if row == self.cursor:
+            self.action_select()
+        self.cursor = row
+
+    def _format_row(self, cells):
+        return "  ".join(
+            cell.rjust(self.column_widths[column]) if column == "sequence_length" else cell.ljust(self.column_widths[column])
+            for column, cell in zip(LocusIndex.COLUMNS, cells)
         )
-        
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        width = self.size.width
+
+        if y == 0:
+            titles = []
+            for column in LocusIndex.COLUMNS:
+                if column == self.sort_column:
+                    column += " ▼" if self.descending else " ▲"
+                titles.append(column)
+            line = self._format_row(titles)
+            style = self.get_component_rich_style("locus-list--header")
+        else:
+            row = scroll_y + y - 1
+            if row >= len(self.rows):
+                return Strip.blank(width)
+
+            locus_index = int(self.rows[row])
+            line = self._format_row([
+                self.index.locus_ids.iat[locus_index],
+                self.index.names.iat[locus_index],
+                f"{self.index.lengths[locus_index]:,}",
+            ])
+            style = self.get_component_rich_style("locus-list--cursor") if row == self.cursor else None
+
+        line = line[scroll_x:scroll_x + width].ljust(width)
+        return Strip([Segment(line, style)])
+
 
 class LocusSwitcher(Static):
-    DISPLAYED_COLUMNS = ["locus_id", "name", "sequence_length"]
     BINDINGS = [
         ("escape", "exit_switcher()", "Exit locus switcher"),
     ]
 
-    current_features = None
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.locus_index = LocusIndex()
 
     def compose(self):
+        yield Input(placeholder="Filter loci by name, or by length like >10k", id="locus-switcher-filter")
         yield Horizontal(
-            DataTable(cursor_type="row", classes="visible-features-data-table focus-highlight-background"),
+            LocusList(self.locus_index, classes="visible-features-data-table focus-highlight-background"),
             VerticalScroll(Markdown("I am a Markdown", classes="visible-features-details"), classes="focus-highlight-background")
         )
 
-    def on_mount(self) -> None:
-        table = self.query_one(DataTable)
-        table.add_columns(*self.DISPLAYED_COLUMNS)
+    def sync(self, locus_data):
+        """
+        Add the loci which were loaded since the last call, keeping the list as it is otherwise
+        """
+        if len(self.locus_index) == len(locus_data):
+            return
+        self.locus_index.sync(locus_data)
+        self.query_one(LocusList).update_rows()
 
+    def on_input_changed(self, event):
+        self.query_one(LocusList).filter(event.value)
 
-    def display_features(self, features):
-        table = self.query_one(DataTable)
-        table.clear()
-        self.current_features = features
-        table.add_rows(
-            list(features[self.DISPLAYED_COLUMNS].itertuples(index=False, name=None))
-        )
-    
-    def on_data_table_row_highlighted(self, event):
-        details_markdown = self.query_one(".visible-features-details")
-        
-        details_markdown.update(
-            "_" + self.current_features.description.iloc[event.cursor_row] + "_\n\n" +
-            self.current_features.formatted_annotations.iloc[event.cursor_row]
+    def on_input_submitted(self, event):
+        self.app.set_focus(self.query_one(LocusList))
+
+    def on_locus_list_highlighted(self, event):
+        locus = self.app.locus_data.iloc[event.locus_index]
+        self.query_one(".visible-features-details").update(
+            "_" + locus.description + "_\n\n" + format_record_annotations(locus.annotations)
         )
+        self.post_message(self.LocusHighlighted(event.locus_index))
 
-    class ChangeCurrentLocus(Message):
+    def on_locus_list_selected(self, event):
+        self.post_message(self.ChangeCurrentLocus(event.locus_index))
+
+    class LocusHighlighted(Message):
         def __init__(self, locus_index):
             self.locus_index = locus_index
             super().__init__()
 
-    def on_data_table_row_selected(self, event):       
-        self.post_message(self.ChangeCurrentLocus(event.cursor_row))
+    class ChangeCurrentLocus(Message):
+        def __init__(self, locus_index):
+            self.locus_index = locus_index
+            super().__init__()
 
     class Exit(Message):
         def __init__(self):
@@ -94,38 +360,75 @@ class TextSearch(Static):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.search_generation = 0
 
     def compose(self):
         yield Input(id="text-search-input")
         with ContentSwitcher(id="text-search-switcher", initial="no-query"):
             yield Static("No query",id="no-query", classes="text-search-placeholder")
+            yield Static("Searching…",id="searching", classes="text-search-placeholder")
+            yield Static("The file is still loading, try again in a moment",id="still-loading", classes="text-search-placeholder")
             yield Static("Nothing found",id="nothing-found", classes="text-search-placeholder")
-            yield FeatureQualifiers(id="text-search-results")
+            yield SearchResults(id="text-search-results")
 
     def on_input_submitted(self, event):
         query = event.value
 
         if query == "":
+            self.cancel_search()
             self.query_one(ContentSwitcher).current = "no-query"
             return
 
-        results_display = self.query_one(FeatureQualifiers)
-        current_locus_data = self.app.get_current_locus_data()
+        if self.app.search_index is None:
+            self.query_one(ContentSwitcher).current = "still-loading"
+            return
 
-        matches = current_locus_data[
-            current_locus_data.qualifiers.str.contains(query)
-        ]
+        self.query_one(ContentSwitcher).current = "searching"
+        self.search_generation += 1
+        self.run_search(query, self.search_generation)
 
-        if matches.empty:
-            self.query_one(ContentSwitcher).current = "nothing-found"
+    def cancel_search(self):
+        self.workers.cancel_group(self, "search")
+        # Batches of a cancelled search that are already on their way are ignored
+        self.search_generation += 1
+
+    @work(thread=True, exclusive=True, group="search")
+    def run_search(self, query, generation):
+        # Exclusive workers cancel the search that was running before
+        worker = get_current_worker()
+
+        # Results are grouped by locus, with the loci in the order of the file
+        matches_by_locus = self.app.search_index.iter_search_by_locus(query, loci=self.app.locus_data.index)
+
+        found_any = False
+        for _, matches in matches_by_locus:
+            if worker.is_cancelled:
+                return
+
+            self.app.call_from_thread(self._show_results, generation, matches, not found_any)
+            found_any = True
+
+        if not found_any and not worker.is_cancelled:
+            self.app.call_from_thread(self._show_nothing_found, generation)
+
+    def _show_results(self, generation, matches, first_batch):
+        if generation != self.search_generation:
             return
-        
-        self.query_one(ContentSwitcher).current = "text-search-results"
-        results_display.display_features(matches)
 
-        self.app.set_focus(
-            self.query_one(DataTable)
-        )
+        results_display = self.query_one(SearchResults)
+
+        if first_batch:
+            self.query_one(ContentSwitcher).current = "text-search-results"
+            results_display.display_features(matches)
+            self.app.set_focus(
+                self.query_one(DataTable)
+            )
+        else:
+            results_display.append_features(matches)
+
+    def _show_nothing_found(self, generation):
+        if generation == self.search_generation:
+            self.query_one(ContentSwitcher).current = "nothing-found"
 
     class SearchResultSelected(Message):
         def __init__(self, feature):
@@ -138,13 +441,16 @@ class TextSearch(Static):
 
 
     def on_data_table_row_selected(self, event):
-        results_display = self.query_one(FeatureQualifiers)
-        selected_feature = results_display.current_features.iloc[event.cursor_row]
+        results_display = self.query_one(SearchResults)
+        selected_feature = results_display.feature(int(event.row_key.value))
+        if selected_feature is None:
+            return
         self.post_message(
             self.SearchResultSelected(selected_feature)
         )
 
     def action_exit_search(self):
+        self.cancel_search()
         self.post_message(self.ExitSearch())
 
     
@@ -177,11 +483,17 @@ class DataViewer(Static):
             self.query_one("#visible-features  .visible-features-data-table")
         )
 
+    def add_loci(self, locus_data):
+        # The locus switcher is kept up to date, so that opening it doesn't rebuild it
+        self.query_one(LocusSwitcher).sync(self.app.locus_data)
+
     def show_locus_switcher(self):
         self.query_one("#data-viewer-tabs").current = "locus-switcher"
         self.border_title = "Current file loci"
 
-        self.query_one(LocusSwitcher).display_features(self.app.locus_data.reset_index())
+        locus_switcher = self.query_one(LocusSwitcher)
+        locus_switcher.sync(self.app.locus_data)
+        locus_switcher.query_one(LocusList).show_locus(self.app.locus_data.index.get_loc(self.app.current_locus))
 
         self.app.set_focus(
             self.query_one("#locus-switcher  .visible-features-data-table")
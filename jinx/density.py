@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+
+# Eighths of a cell, from the lowest non-empty bar to a full one
+SPARKLINE_BARS = "▁▂▃▄▅▆▇█"
+
+
+class DensityPyramid:
+    """
+    Number of features overlapping bins of 2**level nucleotides, for every power-of-two level
+    from the finest one with at most max_bins bins up to a single bin for the whole locus.
+    Features are counted separately per track, i.e. per feature type and strand.
+    """
+
+    def __init__(self, start, end, strand, type_code, type_names, genome_length, max_bins=2**14):
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        strand = np.asarray(strand, dtype=np.int64)
+        type_code = np.asarray(type_code, dtype=np.int64)
+
+        # Tracks ordered by feature type, then forward, unstranded and reverse strand
+        track_keys, track = np.unique(type_code * 3 + (1 - strand) % 3, return_inverse=True)
+        self.tracks = [(type_names[key // 3], 1 - key % 3) for key in track_keys.tolist()]
+        self.track_type_codes = track_keys // 3
+
+        self.genome_length = genome_length
+        self.base_level = max(math.ceil(math.log2(max(genome_length, 1) / max_bins)), 0)
+        self.top_level = max(self.base_level, int(genome_length).bit_length())
+        self.counts = {}
+        self.max_counts = {}
+
+        for level in range(self.base_level, self.top_level + 1):
+            counts = self._histogram(start, end, track, level)
+            self.counts[level] = counts
+            self.max_counts[level] = counts.max(axis=1) if counts.size else np.zeros(len(self.tracks), dtype=np.int32)
+
+    def _histogram(self, start, end, track, level):
+        bins = (self.genome_length >> level) + 1
+        first = np.clip(start >> level, 0, bins - 1)
+        last = np.clip((np.maximum(end, start + 1) - 1) >> level, 0, bins - 1)
+
+        # +1 where a feature enters, -1 after the bin where it leaves, then a running sum along each track
+        size = len(self.tracks) * (bins + 1)
+        changes = np.bincount(track * (bins + 1) + first, minlength=size) - np.bincount(track * (bins + 1) + last + 1, minlength=size)
+        return np.cumsum(changes.reshape(len(self.tracks), bins + 1), axis=1)[:, :bins].astype(np.int32)
+
+    @classmethod
+    def from_store(cls, features, genome_length, max_bins=2**14):
+        return cls(features.start, features.end, features.strand, features.type_code, features.type_names, genome_length, max_bins)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def nbytes(self):
+        return sum(counts.nbytes for counts in self.counts.values())
+
+    def level(self, nt_per_square):
+        """
+        Return the level with bins of nt_per_square nucleotides, or None if there is none
+        """
+        level = int(nt_per_square).bit_length() - 1
+        if 1 << level != nt_per_square or level not in self.counts:
+            return None
+        return level
+
+    def sparkline(self, level, track, left, right):
+        """
+        Return the bars of a track for the bins in [left, right), scaled to the fullest bin of the track at this level
+        """
+        counts = self.counts[level][track, max(left, 0):max(right, 0)]
+        max_count = max(int(self.max_counts[level][track]), 1)
+
+        heights = (counts * len(SPARKLINE_BARS) + max_count - 1) // max_count
+        return "".join([SPARKLINE_BARS[height - 1] if height else " " for height in heights.tolist()])
@@ -0,0 +1,414 @@
+import mmap
+import os
+import re
+
+from compressed_input import RECORD_START, bgzf_index, compression, iter_records
+from sequence_store import LazySequence
+
+# Column layout of the genbank flat file
+HEADER_INDENT = 12
+FEATURE_INDENT = 21
+FEATURE_TABLE_END = re.compile(rb"^\S", re.MULTILINE)
+SIMPLE_LOCATION = re.compile(r"(complement\()?(\d+)\.\.(\d+)(?(1)\))")
+
+# Feature locations are combined from their parts like in Biopython
+COMPOUND_OPERATORS = ("join(", "order(", "bond(")
+
+
+def _split_top_level(text):
+    """
+    Split the arguments of a location operator on the commas which are not nested in parentheses
+    """
+    parts, depth, first = [], 0, 0
+    for i, character in enumerate(text):
+        if character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+        elif character == "," and depth == 0:
+            parts.append(text[first:i])
+            first = i + 1
+    parts.append(text[first:])
+    return parts
+
+
+def _position(text, last):
+    """
+    Integer value of a (possibly fuzzy) position like <1, >50, (1.5) or one-of(1,4)
+    """
+    if text.startswith("one-of("):
+        # Like Biopython, the smallest choice for starts and the largest one for ends
+        choices = [int(choice) for choice in text[7:-1].split(",")]
+        return max(choices) if last else min(choices)
+
+    text = text.strip("<>()")
+    if "." in text:
+        # Within position: the first number for starts, the last one for ends
+        text = text.split(".")[-1 if last else 0]
+    return int(text)
+
+
+def _location_parts(location, length, circular):
+    """
+    Return a list of (start, end, strand) in python coordinates for every part of a location string
+    """
+    if location.startswith("complement("):
+        return [(start, end, -strand) for start, end, strand in reversed(_location_parts(location[11:-1], length, circular))]
+
+    for operator in COMPOUND_OPERATORS:
+        if location.startswith(operator):
+            parts = []
+            for part in _split_top_level(location[len(operator):-1]):
+                parts.extend(_location_parts(part, length, circular))
+            return parts
+
+    if ":" in location:
+        # Part on another record, its coordinates are kept as they are
+        location = location.split(":", 1)[1]
+
+    if ".." in location:
+        left, right = location.split("..")
+        start, end = _position(left, last=False) - 1, _position(right, last=True)
+        if start > end and circular:
+            # Feature wrapping around the origin
+            return [(start, length, 1), (0, end, 1)]
+        return [(start, end, 1)]
+
+    if "^" in location:
+        # Site between two bases
+        position = _position(location.split("^")[0], last=False)
+        return [(position, position, 1)]
+
+    position = _position(location, last=False)
+    return [(position - 1, position, 1)]
+
+
+def parse_location(location, length, circular=False, stranded=True):
+    """
+    Return (start, end, strand) of a feature location string, same as the location of a Biopython SeqFeature.
+    Strand is None for mixed strand features and for protein records.
+    """
+    simple = SIMPLE_LOCATION.fullmatch(location)
+    if simple and stranded and int(simple[2]) <= int(simple[3]):
+        return int(simple[2]) - 1, int(simple[3]), -1 if simple[1] else 1
+
+    location = "".join(location.split())
+    if "replace" in location:
+        # Old style replace(266,"c") locations
+        location = location[8:location.find(",")]
+
+    parts = _location_parts(location, length, circular)
+    strands = {strand for _, _, strand in parts}
+
+    strand = strands.pop() if len(strands) == 1 and stranded else None
+    return min(start for start, _, _ in parts), max(end for _, end, _ in parts), strand
+
+
+def _clean_qualifier(key, value):
+    """
+    Strip the quotes of a qualifier value
+    """
+    if len(value) > 1 and value[0] == '"' and value[-1] == '"':
+        value = value[1:-1]
+    elif len(value) > 1 and value[0] == '"':
+        # Quote left open until the end of the feature
+        value = value[1:]
+    if '""' in value:
+        value = value.replace('""', '"')
+
+    if key == "translation":
+        value = "".join(value.split())
+    return value
+
+
+def parse_feature(lines):
+    """
+    Split the lines of a single feature (without the 21 column indent) into its location string
+    and a dict of qualifier value lists
+    """
+    lines = [line for line in lines if line]
+
+    i = 1
+    location = lines[0]
+    while i < len(lines) and not lines[i].startswith("/"):
+        # Location spanning multiple lines
+        location += lines[i]
+        i += 1
+
+    qualifiers = {}
+    while i < len(lines):
+        key, separator, value = lines[i][1:].partition("=")
+        i += 1
+
+        if not separator:
+            # Qualifier without a value, e.g. /pseudo
+            qualifiers.setdefault(key, [""])
+            continue
+
+        if value[:1] == " " and value.lstrip()[:1] == '"':
+            value = value.lstrip()
+
+        if value[:1] == '"' and value != '"':
+            # Quoted values continue until the closing quote. Quotes in the value are escaped as "",
+            # so the value is closed once a line ends with a quote and the quotes are paired up.
+            value_lines = [value]
+            quotes = value.count('"')
+            while (quotes % 2 or value_lines[-1][-1] != '"') and i < len(lines):
+                value_lines.append(lines[i])
+                quotes += lines[i].count('"')
+                i += 1
+        else:
+            value_lines = [value]
+            while i < len(lines) and not lines[i].startswith("/"):
+                value_lines.append(lines[i])
+                i += 1
+
+        value = value_lines[0] if len(value_lines) == 1 else " ".join(value_lines)
+        qualifiers.setdefault(key, []).append(_clean_qualifier(key, value))
+
+    return location, qualifiers
+
+
+def parse_locus_line(line):
+    """
+    Return (name, sequence length, annotations, stranded) of a LOCUS line
+    """
+    fields = line.split()
+    if len(fields) < 4 or fields[3] not in ("bp", "aa", "rc"):
+        raise ValueError(f"Did not recognise the LOCUS line layout:\n{line}")
+
+    name, length, unit = fields[1], int(fields[2]), fields[3]
+
+    if line[40:44] in (" bp ", " aa ", " rc "):
+        # Current column layout
+        line = line.ljust(79)
+        molecule_type, topology, division, date = line[44:54], line[55:63], line[64:67], line[68:79]
+    elif line[29:33] in (" bp ", " aa ", " rc "):
+        # Old column layout
+        line = line.ljust(73)
+        molecule_type, topology, division, date = line[33:41], line[42:51], line[52:55], line[62:73]
+    else:
+        # Space separated, as written by some tools
+        rest = fields[4:] + [""] * 4
+        if rest[1] not in ("linear", "circular"):
+            rest.insert(1, "")
+        molecule_type, topology, division, date = rest[:4]
+
+    annotations = {}
+    for key, value in (("molecule_type", molecule_type), ("topology", topology), ("data_file_division", division), ("date", date)):
+        if value.strip():
+            annotations[key] = value.strip()
+
+    stranded = unit != "aa" and "PROTEIN" not in molecule_type.upper()
+    return name, length, annotations, stranded
+
+
+def _join_header_entries(lines):
+    """
+    Group header lines into (keyword, [lines]) entries, where continuation lines
+    belong to the keyword above them. Subkeywords like ORGANISM get their own entry.
+    """
+    entries = []
+    for line in lines:
+        keyword = line[:HEADER_INDENT].strip()
+        if keyword:
+            entries.append((keyword, [line[HEADER_INDENT:].strip()]))
+        elif entries:
+            entries[-1][1].append(line[HEADER_INDENT:].strip())
+    return entries
+
+
+def parse_header(lines, annotations):
+    """
+    Parse the header lines between LOCUS and FEATURES into (accession id, version, description, dbxrefs).
+    Annotations are added to the given dict; REFERENCE blocks are skipped.
+    """
+    accession_id, version, description, dbxrefs = None, None, "", []
+
+    for keyword, values in _join_header_entries(lines):
+        text = " ".join(values)
+
+        if keyword == "DEFINITION":
+            description = text.removesuffix(".")
+        elif keyword == "ACCESSION":
+            accessions = text.replace(";", " ").split()
+            if accessions:
+                annotations["accessions"] = accessions
+                accession_id = accession_id or accessions[0]
+        elif keyword == "VERSION":
+            version_id = " ".join(text.split()).split(" GI:")[0]
+            accession, _, suffix = version_id.partition(".")
+            if suffix.isdigit():
+                accession_id = accession_id or accession
+                version = int(suffix)
+                annotations["sequence_version"] = version
+            elif version_id:
+                accession_id = version_id
+        elif keyword == "PROJECT":
+            dbxrefs.extend(text.replace("GenomeProject:", "Project:").split())
+        elif keyword == "DBLINK":
+            for value in values:
+                value = value.replace(": ", ":")
+                if value not in dbxrefs:
+                    dbxrefs.append(value)
+        elif keyword == "KEYWORDS":
+            keywords = "" if text == "." else text.removesuffix(".")
+            annotations["keywords"] = [keyword.strip() for keyword in keywords.split(";")]
+        elif keyword == "SOURCE":
+            annotations["source"] = text.removesuffix(".")
+        elif keyword == "ORGANISM":
+            # The lineage follows the organism name and is recognised by its semicolons
+            organism = [values[0]]
+            lineage = ""
+            for value in values[1:]:
+                if lineage or ";" in value or value.endswith("."):
+                    lineage += " " + value
+                elif value != ".":
+                    organism.append(value)
+            annotations["organism"] = " ".join(organism)
+            lineage = lineage.strip().removesuffix(".")
+            annotations["taxonomy"] = [taxon.strip() for taxon in lineage.split(";") if taxon.strip()]
+        elif keyword == "COMMENT":
+            annotations["comment"] = "\n".join(values)
+
+    return accession_id, version, description, dbxrefs
+
+
+def _read_record(i, locus_line, buffer, genbank_path, offset=0):
+    """
+    Read a single record from the buffer positioned after its LOCUS line.
+    The sequence is not parsed, only the byte range of the ORIGIN block is recorded
+    and the sequence is read from there on demand. offset is the position of the buffer in the file.
+    """
+    name, length, annotations, stranded = parse_locus_line(locus_line)
+    circular = annotations.get("topology") == "circular"
+
+    header_lines = []
+    line = buffer.readline().decode(errors="replace").rstrip()
+    while not line.startswith(("FEATURES", "ORIGIN", "//", "CONTIG", "BASE COUNT")):
+        header_lines.append(line)
+        line = buffer.readline().decode(errors="replace").rstrip()
+        if not line and buffer.tell() == len(buffer):
+            raise ValueError(f"Premature end of file in record {name}")
+
+    accession_id, version, description, dbxrefs = parse_header(header_lines, annotations)
+    locus_id = accession_id or name
+    if version is not None and "." not in locus_id:
+        locus_id += f".{version}"
+    if locus_id == "<unknown id>":
+        locus_id = f"LOCUS_{i+1:04d}"
+
+    feature_rows = []
+    if line.startswith("FEATURES"):
+        # The feature table ends at the first line which isn't indented
+        block_start = buffer.tell()
+        block_end = FEATURE_TABLE_END.search(buffer, block_start)
+        block_end = block_end.start() if block_end else len(buffer)
+        buffer.seek(block_end)
+
+        feature_key, feature_lines = None, []
+        for line in buffer[block_start:block_end].decode(errors="replace").splitlines():
+            if line[5:FEATURE_INDENT].strip():
+                if feature_key is not None:
+                    feature_rows.append(_feature_row(feature_key, feature_lines, locus_id, length, circular, stranded))
+                feature_key, feature_lines = line[5:FEATURE_INDENT].strip(), []
+            feature_lines.append(line[FEATURE_INDENT:].strip())
+        if feature_key is not None:
+            feature_rows.append(_feature_row(feature_key, feature_lines, locus_id, length, circular, stranded))
+
+        line = buffer.readline().decode(errors="replace").rstrip()
+
+    # Skip CONTIG and BASE COUNT lines
+    while not line.startswith(("ORIGIN", "//")) and buffer.tell() < len(buffer):
+        line = buffer.readline().decode(errors="replace").rstrip()
+
+    origin_start = origin_end = sequence = None
+    if line.startswith("ORIGIN"):
+        origin_start = buffer.tell()
+        record_end = buffer.find(b"\n//", origin_start - 1)
+        origin_end = record_end + 1 if record_end != -1 else len(buffer)
+        buffer.seek(origin_end)
+        buffer.readline()
+        origin_start, origin_end = origin_start + offset, origin_end + offset
+        sequence = LazySequence(genbank_path, origin_start, origin_end, length)
+
+    locus_row = [locus_id, name, description, dbxrefs, annotations, sequence, length, origin_start, origin_end]
+    return locus_row, feature_rows
+
+
+def _feature_row(feature_type, lines, locus, length, circular, stranded):
+    location, qualifiers = parse_feature(lines)
+    start, end, strand = parse_location(location, length, circular, stranded)
+
+    locus_tag = qualifiers.get("locus_tag", ["no_tag"])[0]
+    product = qualifiers.get("product", ["no_product"])[0]
+    gene = qualifiers.get("gene", ["no_gene_name"])[0]
+    label = qualifiers.get("gene", ["no_label"])[0]
+
+    qualifiers_list = [(k, v) for k, value_list in qualifiers.items() for v in value_list]
+    qualifier_lines = "\n".join([f"{k}={v}" for k, v in qualifiers_list])
+
+    return [feature_type, locus, start, end, strand, locus_tag, product, gene, label, qualifier_lines]
+
+
+def record_offsets(genbank_path):
+    """
+    Return the byte offsets of the LOCUS lines starting the records of a genbank file
+    """
+    kind = compression(genbank_path)
+    if kind == "bgzf":
+        return bgzf_index(genbank_path).record_offsets
+    if kind is not None:
+        return [offset for offset, _, _ in iter_records(genbank_path)]
+
+    with open(genbank_path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return []
+
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return [match.start() for match in RECORD_START.finditer(buffer)]
+
+
+def iter_genbank_fast(genbank_path, start=0, end=None, first_index=0):
+    """
+    Lazily parse the feature tables of a genbank file record by record, without parsing the sequences.
+    Yields (locus_row, feature_rows, bytes_read) for every record, like parsers.iter_genbank.
+    Only the records starting in [start, end) are parsed, first_index being the index of the first of them in the file.
+    Compressed files are decompressed on the fly, and offsets are those of the uncompressed file.
+    """
+    if compression(genbank_path) is not None:
+        yield from _iter_compressed(genbank_path, start, end, first_index)
+        return
+
+    with open(genbank_path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            end = len(buffer) if end is None else end
+            buffer.seek(start)
+
+            i = first_index
+            while buffer.tell() < end and (line := buffer.readline()):
+                if line.startswith(b"LOCUS"):
+                    locus_row, feature_rows = _read_record(i, line.decode(errors="replace").rstrip(), buffer, genbank_path)
+                    i += 1
+                    yield locus_row, feature_rows, buffer.tell()
+
+
+def _iter_compressed(genbank_path, start, end, first_index):
+    for i, (offset, record, bytes_read) in enumerate(iter_records(genbank_path, start, end), first_index):
+        # Records are small enough to be copied to an anonymous map, which reads like the map of a plain file
+        with mmap.mmap(-1, len(record)) as buffer:
+            buffer.write(record)
+            buffer.seek(0)
+            locus_line = buffer.readline().decode(errors="replace").rstrip()
+            locus_row, feature_rows = _read_record(i, locus_line, buffer, genbank_path, offset)
+        yield locus_row, feature_rows, bytes_read
+
+
+def parse_records(genbank_path, start, end, first_index):
+    """
+    Parse the records starting in [start, end) at once, for worker processes
+    """
+    return list(iter_genbank_fast(genbank_path, start, end, first_index))
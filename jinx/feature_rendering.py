@@ -0,0 +1,313 @@
+from textual.strip import Strip
+
+from rich.segment import Segment
+
+from collections import namedtuple
+
+from labels import place_labels, PlacedLabels
+from layout import FeatureLayout
+
+import numpy as np
+
+LabelTuple = namedtuple("LabelTuple", ["above", "below"])
+
+STRAND_SYMBOLS = {1: "▶", -1: "◀", 0: "●"}
+
+
+class FeatureRendering:
+    """
+    Draws the lines of a locus from its layout at one zoom level, independently of any widget.
+    Classes using it provide size, virtual_size, density_threshold, get_component_rich_style
+    and the prepared locus (prepared, features, feature_type_classes),
+    and call _lay_out_visible_features before rendering rows of a new viewport.
+    """
+
+    # Feature types which are neither laid out nor drawn
+    hidden_types = frozenset()
+
+    def _layout_key(self, locus, features, nt_per_square):
+        # Hiding types which a locus has no features of doesn't change its layout
+        return (locus, nt_per_square, frozenset(features.type_codes(self.hidden_types)))
+
+    def _new_layout(self, features, nt_per_square):
+        # Only the shown features are packed into rows, they are already sorted
+        shown_rows = features.shown_rows(features.type_codes(self.hidden_types))
+        return FeatureLayout(features.start, features.end, nt_per_square, rows=shown_rows)
+
+    @property
+    def density(self):
+        return self.prepared.density
+
+    def _shown_density_tracks(self):
+        return [track for track, (type_name, _) in enumerate(self.density.tracks) if type_name not in self.hidden_types]
+
+    def _get_density_level(self, prepared, nt_per_square):
+        """
+        Return the density pyramid level to draw a locus at the given zoom, or None if its features should be drawn
+        """
+        hidden_codes = prepared.features.type_codes(self.hidden_types)
+        shown_count = len(prepared.features) - sum(len(prepared.features.type_rows[code]) for code in hidden_codes)
+        features_per_square = shown_count * nt_per_square / max(prepared.genome_length, 1)
+        if features_per_square <= self.density_threshold:
+            return None
+        return prepared.density.level(nt_per_square)
+
+    def _get_feature_style(self, segment_class):
+        try:
+            return self.get_component_rich_style(f"featurevier--{segment_class}")
+        except KeyError:
+            # Given class is not defined
+            return self.get_component_rich_style("featurevier--default-feature")
+
+    def _get_feature_segment(self, feature_width, segment_class=None, left_overflow=0, right_overflow=0, strand=0):
+        rich_style = self._get_feature_style(segment_class)
+
+        displayed_feature_width = feature_width - left_overflow - right_overflow
+        displayed_feature_string = "━" * displayed_feature_width
+
+        if left_overflow > 0:
+            displayed_feature_string = "┅" + displayed_feature_string[1:]
+
+        if right_overflow > 0:
+            displayed_feature_string = displayed_feature_string[:-1] + "┅"
+
+        if feature_width == 1:
+            if strand == 1:
+                displayed_feature_string = "▶"
+            elif strand == -1:
+                displayed_feature_string = "◀"
+            else:
+                displayed_feature_string = "●"
+        else:
+            if strand == 1 and left_overflow == 0:
+                displayed_feature_string = "╺" + displayed_feature_string[1:]
+            elif strand == -1 and right_overflow == 0:
+                displayed_feature_string = displayed_feature_string[1:] + "╸"
+
+
+        if displayed_feature_width > 1:
+            if strand == 1:
+                if right_overflow > 0:
+                    segments = [
+                        Segment(displayed_feature_string[:-2], rich_style),
+                        Segment("▶", rich_style),
+                        Segment(displayed_feature_string[-1], rich_style),
+                    ]
+                else:
+                    segments = [
+                        Segment(displayed_feature_string[:-1], rich_style),
+                        Segment("▶", rich_style),
+                    ]
+
+            elif strand == -1:
+                if left_overflow > 0:
+                    segments = [
+                        Segment(displayed_feature_string[0], rich_style),
+                        Segment("◀", rich_style),
+                        Segment(displayed_feature_string[2:], rich_style),
+                    ]
+                else:
+                    segments = [
+                        Segment("◀", rich_style),
+                        Segment(displayed_feature_string[1:], rich_style),
+                    ]
+            else:
+                segments = [Segment(displayed_feature_string, rich_style)]
+        else:
+            segments = [Segment(displayed_feature_string, rich_style)]
+
+        return segments
+
+    def _lay_out_visible_features(self, leftmost_position_cell, rightmost_position_cell):
+        # Update which features are visible on the x axis
+        self.visible_features = self.layout.viewport_index.query(leftmost_position_cell, rightmost_position_cell)
+
+        if len(self.visible_features):
+            self.last_visible_row = int(self.layout.vertical_group[self.visible_features].max())
+            # Update which labels are visible
+            self.labels_within_bounds = self._compute_current_labels(leftmost_position_cell, rightmost_position_cell)
+
+    def _group_labels_by_row(self, placed_labels, visible_features):
+        # Labels are sorted by their row, so that the labels and stems of a row are two consecutive slices
+        order = np.argsort(placed_labels.vertical_group, kind="stable")
+        return PlacedLabels(
+            visible_features[placed_labels.feature[order]],
+            placed_labels.x_coord[order],
+            placed_labels.vertical_group[order]
+        )
+
+    def _compute_current_labels(self, left_screen_bound, right_screen_bound):
+        visible_features = self.visible_features
+
+        # We are trying to center the features -> we have an equal number of rows above and below them
+        available_label_space = (self.virtual_size.height - self.last_visible_row) // 2 - 1
+
+        placement = place_labels(
+            self.layout.screen_start[visible_features],
+            self.layout.screen_end[visible_features],
+            self.layout.vertical_group[visible_features],
+            self.features.label_width[visible_features],
+            left_screen_bound,
+            right_screen_bound,
+            available_label_space
+        )
+
+        return LabelTuple(
+            self._group_labels_by_row(placement.above, visible_features),
+            self._group_labels_by_row(placement.below, visible_features)
+        )
+
+    def _render_feature_strip(self, features_to_render, leftmost_position_cell, rightmost_position_cell):
+        if len(features_to_render) == 0:
+            return Strip.blank(self.size.width)
+
+        segments = []
+        current_position = leftmost_position_cell
+
+        for screen_start, screen_end, screen_feature_width, type_code, strand in zip(
+            self.layout.screen_start[features_to_render].tolist(),
+            self.layout.screen_end[features_to_render].tolist(),
+            self.layout.screen_feature_width[features_to_render].tolist(),
+            self.features.type_code[features_to_render].tolist(),
+            self.features.strand[features_to_render].tolist(),
+        ):
+
+            if screen_start < leftmost_position_cell:
+                left_overflow = leftmost_position_cell - screen_start
+                right_overflow = max(screen_end - rightmost_position_cell, 0)
+
+            elif screen_end >= rightmost_position_cell:
+                segments.append(
+                    Segment(" " * (screen_start - current_position))
+                )
+                left_overflow = 0
+                right_overflow = screen_end - rightmost_position_cell
+                
+            else:
+                segments.append(
+                    Segment(" " * (screen_start - current_position))
+                )
+                left_overflow = right_overflow = 0
+
+
+            segments.extend(
+                self._get_feature_segment(
+                    screen_feature_width, 
+                    self.feature_type_classes[type_code], 
+                    left_overflow=left_overflow,
+                    right_overflow=right_overflow,
+                    strand=strand
+                )
+            )
+                
+            current_position = screen_end
+
+
+        strip = Strip(segments)
+        return strip
+
+    def _render_label_strip(self, labels_to_render, stems_to_render, leftmost_position_cell, rightmost_position_cell):
+        if len(labels_to_render.x_coord) == 0 and len(stems_to_render.x_coord) == 0:
+            return Strip.blank(self.size.width)
+
+        segments = []
+        current_position = leftmost_position_cell
+        label_style = self.get_component_rich_style("featurevier--label")
+
+        # We make stems look like labels and mix them in with the other labels
+        mixed_labels = [
+            (x_coord, self.features.label(feature), label_width)
+            for feature, x_coord, label_width in zip(
+                labels_to_render.feature.tolist(),
+                labels_to_render.x_coord.tolist(),
+                self.features.label_width[labels_to_render.feature].tolist()
+            )
+        ]
+        mixed_labels.extend((x_coord, "│", 1) for x_coord in stems_to_render.x_coord.tolist())
+        mixed_labels.sort(key=lambda label: label[0])
+
+        for x_coord, label, label_width in mixed_labels:
+            segments.append(
+                Segment(" " * (x_coord - current_position))
+            )
+
+            if x_coord + label_width > rightmost_position_cell:
+                # Label goes out of screen -> we truncate it
+                segments.append(
+                    Segment(label[:rightmost_position_cell-(x_coord+label_width)-1] + "…", label_style)
+                )
+            else:
+                segments.append(
+                    Segment(label, label_style)
+                )
+            current_position = x_coord + label_width
+
+
+        strip = Strip(segments)
+        return strip
+
+    def _label_row(self, labels, label_row):
+        # Labels drawn in the given label row and the stems of labels further from the features
+        first = np.searchsorted(labels.vertical_group, label_row, side="left")
+        last = np.searchsorted(labels.vertical_group, label_row, side="right")
+        return (
+            PlacedLabels(labels.feature[first:last], labels.x_coord[first:last], labels.vertical_group[first:last]),
+            PlacedLabels(labels.feature[:first], labels.x_coord[:first], labels.vertical_group[:first])
+        )
+
+    def _render_density_row(self, y, leftmost_position_cell, rightmost_position_cell):
+        # Tracks are centered vertically, one row each
+        tracks = self._shown_density_tracks()
+        track = y - (self.virtual_size.height - len(tracks)) // 2
+        if not 0 <= track < len(tracks):
+            return Strip.blank(self.size.width)
+        track = tracks[track]
+
+        type_name, strand = self.density.tracks[track]
+        style = self._get_feature_style(self.feature_type_classes[self.density.track_type_codes[track]])
+        sparkline = self.density.sparkline(self.density_level, track, leftmost_position_cell, rightmost_position_cell)
+
+        # The track is named at the left edge of the screen
+        track_name = f"{type_name} {STRAND_SYMBOLS[strand]} "
+        return Strip([
+            Segment(track_name, self.get_component_rich_style("featurevier--label")),
+            Segment(sparkline[len(track_name):], style),
+        ])
+
+    def _render_row(self, y, leftmost_position_cell, rightmost_position_cell):
+        if self.density_level is not None:
+            return self._render_density_row(y, leftmost_position_cell, rightmost_position_cell)
+
+        if len(self.visible_features) == 0:
+            return Strip.blank(self.size.width)
+
+        labels_above, labels_below = self.labels_within_bounds
+
+        # Adding constants to create spacing between features and labels
+        last_label_above_row = (self.virtual_size.height - self.last_visible_row) // 2 - 1
+        if len(labels_above.vertical_group):
+            first_label_above_row = max(last_label_above_row - int(labels_above.vertical_group[-1]) - 1, 0)
+        else:
+            first_label_above_row = 0
+
+        last_feature_row = self.last_visible_row + last_label_above_row + 1
+        if len(labels_below.vertical_group):
+            last_label_below_row = int(labels_below.vertical_group[-1]) + last_feature_row + 1
+        else:
+            last_label_below_row = last_feature_row
+
+        if y <= last_label_above_row:
+            # We are rendering labels above
+            labels_to_render, stems_to_render = self._label_row(labels_above, y - first_label_above_row)
+            strip = self._render_label_strip(labels_to_render, stems_to_render, leftmost_position_cell, rightmost_position_cell)
+        
+        elif y <= last_feature_row:
+            # We are rendering features
+            features_to_render = self.layout.row_features(y - last_label_above_row - 1, leftmost_position_cell, rightmost_position_cell)
+            strip = self._render_feature_strip(features_to_render, leftmost_position_cell, rightmost_position_cell)
+        else:
+            # We are rendering labels below
+            labels_to_render, stems_to_render = self._label_row(labels_below, last_label_below_row - y + 1)
+            strip = self._render_label_strip(labels_to_render, stems_to_render, leftmost_position_cell, rightmost_position_cell)
+        
+        return strip
@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+
+# Order in which the viewer lays out the features of a locus
+FEATURE_ORDER = ["start", "end", "feature_type"]
+
+
+def coordinate_dtype(max_value):
+    """
+    Smallest integer type that can hold the coordinates of a locus
+    """
+    return np.int32 if max_value < np.iinfo(np.int32).max else np.int64
+
+
+def in_feature_order(feature_frame):
+    """
+    Whether the rows of a feature table are sorted in FEATURE_ORDER, like sort_values(FEATURE_ORDER) would,
+    i.e. by start, then end, then feature type for the features starting and ending at the same position
+    """
+    feature_type = feature_frame.feature_type
+    if isinstance(feature_type.dtype, pd.CategoricalDtype):
+        # Categoricals sort by the order of their categories
+        feature_type = feature_type.cat.codes
+
+    ordered = np.ones(max(len(feature_frame) - 1, 0), dtype=bool)
+    # From the last key to the first: a row comes before the next one if its key is smaller, or equal and the next keys are ordered
+    for key in (feature_type.to_numpy(), feature_frame.end.to_numpy(), feature_frame.start.to_numpy()):
+        ordered = (key[:-1] < key[1:]) | ((key[:-1] == key[1:]) & ordered)
+    return bool(ordered.all())
+
+
+def compact_feature_columns(feature_frame):
+    """
+    Convert the columns of a parsed feature table to compact types in place:
+    coordinates to int32 (or int64 if needed), strand to int8 and repetitive strings to categoricals
+    """
+    max_coordinate = feature_frame.end.max() if len(feature_frame) else 0
+    dtype = coordinate_dtype(max_coordinate)
+
+    feature_frame["start"] = feature_frame.start.astype(dtype)
+    feature_frame["end"] = feature_frame.end.astype(dtype)
+    # Biopython uses None for features without a strand
+    feature_frame["strand"] = feature_frame.strand.fillna(0).astype(np.int8)
+    feature_frame["feature_type"] = feature_frame.feature_type.astype("category")
+    feature_frame["locus"] = feature_frame.locus.astype("category")
+    return feature_frame
+
+
+class StringPool:
+    """
+    Strings stored back to back in a single string, addressed through an offset table
+    """
+
+    def __init__(self, strings):
+        strings = list(strings)
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+
+        self.data = "".join(strings)
+        self.offsets = np.zeros(len(strings) + 1, dtype=coordinate_dtype(len(self.data)))
+        np.cumsum(lengths, out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return len(self.data) + self.offsets.nbytes
+
+
+class FeatureStore:
+    """
+    Array-backed table with what the viewer needs to draw features:
+    coordinates, strand, feature type codes and labels in a string pool.
+    Rows follow the order of the feature table the store was built from.
+    The rows of every feature type are also kept, so that feature types can be hidden without going through all rows.
+    """
+
+    def __init__(self, start, end, strand, type_code, type_names, labels):
+        self.start = start
+        self.end = end
+        self.strand = strand
+        self.type_code = type_code
+        self.type_names = type_names
+        self.labels = labels
+        self.label_width = labels.lengths
+
+        # Rows by type code, in increasing order
+        type_counts = np.bincount(type_code, minlength=len(type_names)) if len(type_code) else np.zeros(len(type_names), dtype=np.int64)
+        self.type_rows = np.split(
+            np.argsort(type_code, kind="stable").astype(coordinate_dtype(len(type_code))),
+            np.cumsum(type_counts)[:-1]
+        )
+
+    @classmethod
+    def from_frame(cls, feature_frame):
+        feature_types = feature_frame.feature_type.astype("category")
+        dtype = coordinate_dtype(feature_frame.end.max() if len(feature_frame) else 0)
+
+        return cls(
+            start=feature_frame.start.to_numpy(dtype=dtype),
+            end=feature_frame.end.to_numpy(dtype=dtype),
+            strand=feature_frame.strand.fillna(0).to_numpy(dtype=np.int8),
+            type_code=feature_types.cat.codes.to_numpy(),
+            type_names=list(feature_types.cat.categories),
+            labels=StringPool(feature_frame.label.tolist()),
+        )
+
+    def __len__(self):
+        return len(self.start)
+
+    def label(self, i):
+        return self.labels[i]
+
+    def feature_type(self, i):
+        return self.type_names[self.type_code[i]]
+
+    def type_codes(self, feature_types):
+        """
+        Return the codes of the given feature types which this store has features of
+        """
+        return [code for code, name in enumerate(self.type_names) if name in feature_types and len(self.type_rows[code])]
+
+    def shown_rows(self, hidden_codes):
+        """
+        Return the rows of the features whose type is not hidden, in increasing order, or None if no type is hidden
+        """
+        if not hidden_codes:
+            return None
+        shown = np.ones(len(self), dtype=bool)
+        for code in hidden_codes:
+            shown[self.type_rows[code]] = False
+        return np.flatnonzero(shown)
+
+    @property
+    def nbytes(self):
+        return (
+            self.start.nbytes + self.end.nbytes + self.strand.nbytes + self.type_code.nbytes
+            + self.labels.nbytes + self.label_width.nbytes + sum(rows.nbytes for rows in self.type_rows)
+        )
+
+
+class LocusFeatureTable:
+    """
+    Features of all loci sorted once by locus and then in FEATURE_ORDER, with the range of rows of every locus,
+    so that the features of a locus are a slice of a shared table rather than a copy.
+    Loci are added in batches while loading, each batch being a table of its own until they are merged.
+    """
+
+    def __init__(self, tables=(), ranges=None):
+        self.tables = list(tables)
+        # Locus -> (table, first row, last row + 1)
+        self.ranges = {} if ranges is None else ranges
+
+    def __contains__(self, locus):
+        return locus in self.ranges
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def add(self, feature_data):
+        """
+        Sort a batch of features, which holds all features of its loci, and add it
+        """
+        locus_codes = feature_data.locus.cat.codes.to_numpy()
+        # Loci keep the order in which they appear in the batch, i.e. the order of the file
+        loci, first_rows = np.unique(locus_codes, return_index=True)
+        locus_rank = np.empty(locus_codes.max() + 1 if len(locus_codes) else 0, dtype=np.int64)
+        locus_rank[loci[np.argsort(first_rows)]] = np.arange(len(loci))
+
+        order = np.lexsort((
+            feature_data.feature_type.cat.codes.to_numpy(),
+            feature_data.end.to_numpy(),
+            feature_data.start.to_numpy(),
+            locus_rank[locus_codes],
+        ))
+        table = feature_data.take(order)
+
+        sorted_codes = locus_codes[order]
+        boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+        starts = np.concatenate([[0], boundaries]) if len(sorted_codes) else boundaries
+        stops = np.concatenate([boundaries, [len(sorted_codes)]]) if len(sorted_codes) else boundaries
+
+        categories = feature_data.locus.cat.categories
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            self.ranges[categories[sorted_codes[start]]] = (len(self.tables), start, stop)
+        self.tables.append(table)
+
+    def feature_types(self):
+        """
+        Return the feature types of all loci, sorted
+        """
+        return sorted(set().union(*(table.feature_type.cat.categories for table in self.tables)))
+
+    def features(self, locus):
+        """
+        Return the features of a locus, sorted in FEATURE_ORDER, or None if it has none
+        """
+        if locus not in self.ranges:
+            return None
+        table, start, stop = self.ranges[locus]
+        return self.tables[table].iloc[start:stop]
+
+    def merged(self):
+        """
+        Return a copy with all batches merged into a single table
+        """
+        if len(self.tables) <= 1:
+            return LocusFeatureTable(self.tables, dict(self.ranges))
+
+        offsets = np.cumsum([0] + [len(table) for table in self.tables]).tolist()
+        ranges = {
+            locus: (0, offsets[table] + start, offsets[table] + stop)
+            for locus, (table, start, stop) in self.ranges.items()
+        }
+        return LocusFeatureTable([compact_feature_columns(pd.concat(self.tables))], ranges)
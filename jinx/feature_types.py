@@ -0,0 +1,42 @@
+from textual.containers import Vertical
+from textual.message import Message
+from textual.screen import ModalScreen
+from textual.widgets import Label, SelectionList
+
+
+class FeatureTypesScreen(ModalScreen):
+    """
+    Lists the feature types of the loaded files, those which are not selected are hidden in the viewer
+    """
+
+    BINDINGS = [
+        ("escape", "close_screen()", "Exit feature types"),
+        ("t", "close_screen()", "Exit feature types"),
+    ]
+
+    class HiddenTypesChanged(Message):
+        def __init__(self, hidden_types):
+            self.hidden_types = hidden_types
+            super().__init__()
+
+    def __init__(self, feature_types, hidden_types=frozenset()):
+        self.feature_types = feature_types
+        self.hidden_types = hidden_types
+        super().__init__()
+
+    def compose(self):
+        with Vertical(id="feature-types-container"):
+            yield SelectionList(
+                *[(feature_type, feature_type, feature_type not in self.hidden_types) for feature_type in self.feature_types],
+                id="feature-types-list",
+            )
+            yield Label("[blue]Space or click to show or hide a feature type", id="feature-types-message")
+
+    def on_selection_list_selected_changed(self, event):
+        shown_types = set(event.selection_list.selected)
+        self.hidden_types = frozenset(feature_type for feature_type in self.feature_types if feature_type not in shown_types)
+        # Changes are shown right away, the screen stays open
+        self.app.post_message(self.HiddenTypesChanged(self.hidden_types))
+
+    def action_close_screen(self):
+        self.dismiss(None)
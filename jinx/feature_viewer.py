@@ -4,19 +4,48 @@ from textual.strip import Strip
 from textual.message import Message
 from textual.reactive import reactive
 
-from rich.segment import Segment
-from rich.style import Style
+from collections import OrderedDict, Counter
 
-from collections import namedtuple
+from layout import IntervalQuery, LayoutCache
+from density import DensityPyramid
+from feature_rendering import FeatureRendering, LabelTuple
+from feature_store import FeatureStore, FEATURE_ORDER, in_feature_order
 
+import functools
+import numpy as np
 import pandas as pd
 import time
 import math
 
-LabelTuple = namedtuple("LabelTuple", ["above", "below"])
+class PreparedLocus:
+    """
+    Everything the viewer derives from the features of a locus, whatever the zoom
+    """
 
+    def __init__(self, seq_features, genome_length, features, position_index):
+        self.seq_features = seq_features
+        self.genome_length = genome_length
+        self.features = features
+        # Zoom independent, used to find the visible features when they are not laid out
+        self.position_index = position_index
+
+    @functools.cached_property
+    def density(self):
+        # Only needed once the locus is zoomed out past the density threshold, so it is built on first use
+        return DensityPyramid.from_store(self.features, self.genome_length)
+
+
+def prepare_locus(seq_features, genome_length):
+    if not in_feature_order(seq_features):
+        # The tables of loaded loci come sorted already
+        seq_features = seq_features.sort_values(FEATURE_ORDER)
 
-class FeatureViewer(ScrollView):
+    # The render path works with the compact columnar copy, the DataFrame is only passed on to other widgets
+    features = FeatureStore.from_frame(seq_features)
+    return PreparedLocus(seq_features, genome_length, features, IntervalQuery(features.start, features.end))
+
+
+class FeatureViewer(FeatureRendering, ScrollView):
     COMPONENT_CLASSES = {
         "featurevier--label",
         "featurevier--default-feature",
@@ -34,15 +63,37 @@ class FeatureViewer(ScrollView):
     
     nt_per_square = reactive(1)
 
-    def __init__(self, seq_features, genome_length, nt_per_square=1, min_height=10) -> None:
+    def __init__(self, seq_features, genome_length, nt_per_square=1, min_height=10, locus=None, layout_cache_size=32, layout_cache_bytes=None, strip_cache_size=1024, visible_features_delay=0.15, density_threshold=4.0, prepared_cache_size=16) -> None:
         super().__init__()
 
         self.min_height = min_height
         self.genome_length = genome_length
-        self.seq_features = seq_features.sort_values(["start", "end", "feature_type"])
+        self.locus = locus
+        # Finished layouts keyed by (locus, nt_per_square, hidden feature types), so that zooming back to a visited level is instant
+        self.layout_cache = LayoutCache(max_entries=layout_cache_size, max_bytes=layout_cache_bytes)
+        # Zoom independent data of recently shown or warmed up loci, keyed by locus
+        self.prepared_loci = OrderedDict()
+        self.prepared_cache_size = prepared_cache_size
+        # Rendered lines keyed by the viewport state and the absolute row
+        self.strip_cache = OrderedDict()
+        self.strip_cache_size = strip_cache_size
+        # Bumped whenever the layout of the features changes, invalidates the rendered lines
+        self.layout_version = 0
+        self._current_viewport = None
+        # Position updates are sent at most once per frame, visible features once scrolling settles for this long (in seconds)
+        self.visible_features_delay = visible_features_delay
+        self._scrolled_pending = False
+        self._visible_features_pending = False
+        self._last_viewport_change = 0
+        # Updates which were coalesced into a later one, by message
+        self.suppressed_updates = Counter()
+        # Above this many features per cell on average, feature densities are drawn instead of the features
+        self.density_threshold = density_threshold
+        self.density_level = None
+        self.seq_features = self._prepare_features(seq_features)
         self.nt_per_square = nt_per_square # This automatically triggers _initialize_fature_rendering
         self.features_within_bounds = pd.DataFrame()
-        self.labels_within_bounds = pd.DataFrame()
+        self.labels_within_bounds = LabelTuple(None, None)
         
 
     def validate_nt_per_square(self, nt_per_square):
@@ -59,12 +110,17 @@ class FeatureViewer(ScrollView):
         self._initialize_fature_rendering()
 
 
-    def change_visible_features(self, seq_features=None, genome_length=None, nt_per_square=None):
+    def change_visible_features(self, seq_features=None, genome_length=None, nt_per_square=None, locus=None):
         if genome_length is not None:
             self.genome_length = genome_length
         
         if seq_features is not None:
-            self.seq_features = seq_features.sort_values(["start", "end", "feature_type"])
+            if locus is None:
+                # Without a locus, we cannot tell the cached layouts of the new features from the old ones
+                self.layout_cache.clear()
+                self.prepared_loci.clear()
+            self.locus = locus
+            self.seq_features = self._prepare_features(seq_features)
         
         if nt_per_square is not None:
             self.nt_per_square = nt_per_square
@@ -74,58 +130,106 @@ class FeatureViewer(ScrollView):
             self._initialize_fature_rendering()
 
 
+    def _prepare_features(self, seq_features):
+        prepared = self._get_prepared(self.locus, self.genome_length)
+        if prepared is None:
+            prepared = prepare_locus(seq_features, self.genome_length)
+            self._remember_prepared(self.locus, prepared)
+
+        self.prepared = prepared
+        self.features = prepared.features
+        self.feature_type_classes = [f"type-{feature_type.lower()}" for feature_type in self.features.type_names]
+        self.position_index = prepared.position_index
+        return prepared.seq_features
+
+    def _get_prepared(self, locus, genome_length):
+        prepared = self.prepared_loci.get(locus) if locus is not None else None
+        if prepared is None or prepared.genome_length != genome_length:
+            return None
+        self.prepared_loci.move_to_end(locus)
+        return prepared
+
+    def _remember_prepared(self, locus, prepared):
+        if locus is None:
+            return
+        self.prepared_loci[locus] = prepared
+        self.prepared_loci.move_to_end(locus)
+        while len(self.prepared_loci) > self.prepared_cache_size:
+            self.prepared_loci.popitem(last=False)
+
+    def warm_up(self, locus, seq_features, genome_length):
+        """
+        Prepare a locus and lay it out at the current zoom ahead of time, so that switching to it renders immediately.
+        Meant to run in a worker thread: the caches are only looked up and updated on the main thread.
+        """
+        prepared, nt_per_square = self.app.call_from_thread(self._warm_up_state, locus, genome_length)
+        if prepared is None:
+            prepared = prepare_locus(seq_features, genome_length)
+
+        layout_key = self._layout_key(locus, prepared.features, nt_per_square)
+        layout = None
+        if self._get_density_level(prepared, nt_per_square) is None:
+            if not self.app.call_from_thread(self.layout_cache.__contains__, layout_key):
+                layout = self._new_layout(prepared.features, nt_per_square)
+
+        self.app.call_from_thread(self._store_warm_up, locus, prepared, layout_key, layout)
+
+    def _warm_up_state(self, locus, genome_length):
+        return self._get_prepared(locus, genome_length), self.nt_per_square
+
+    def _store_warm_up(self, locus, prepared, layout_key, layout):
+        if locus not in self.prepared_loci:
+            self._remember_prepared(locus, prepared)
+        if layout is not None:
+            self.layout_cache.put(layout_key, layout)
+
+
     def _initialize_fature_rendering(self):
         """
         Precompute how the features should be rendered.
         We need to call this whenever a zoom level changes
         """
-        self._compute_screen_positions()
-        self._assign_vertical_groups()
+        self.density_level = self._get_density_level(self.prepared, self.nt_per_square)
+        if self.density_level is None:
+            self._apply_layout(self._get_layout())
+        self._update_virtual_size()
 
-        self.seq_features_interval_index = pd.IntervalIndex.from_arrays(
-            self.seq_features.screen_start, 
-            self.seq_features.screen_end,
-            closed="left"
-        )
+        self.layout_version += 1
+        self.strip_cache.clear()
+        self.refresh()
 
+    def _update_virtual_size(self):
         # The virtual_size determines the scrollbar range
         self.virtual_size = Size(self.genome_length//self.nt_per_square+1, max(self.min_height, self.size.height))
     
     def on_resize(self):
+        # The layout doesn't depend on the widget size, only the scrollable area
+        # and the space available for labels (derived from virtual_size) do
+        self._update_virtual_size()
+
+
+    def hide_feature_types(self, feature_types):
+        """
+        Hide the features of the given types in all loci.
+        The prepared loci are kept, only the shown features of the current locus are laid out again,
+        unless this was done before for the same types.
+        """
+        self.hidden_types = frozenset(feature_types)
         self._initialize_fature_rendering()
 
+    def _get_layout(self):
+        key = self._layout_key(self.locus, self.features, self.nt_per_square)
+        layout = self.layout_cache.get(key)
 
-    def _compute_screen_positions(self):
-        self.seq_features["screen_start"] = (self.seq_features.start) // int(self.nt_per_square) 
-        self.seq_features["screen_end"] = (self.seq_features.end - 1 ) // int(self.nt_per_square) + 1 # We add one, because the end is not inclusive
-        self.seq_features["screen_feature_width"] = self.seq_features.screen_end - self.seq_features.screen_start
-        self.seq_features.loc[self.seq_features.screen_feature_width < 1, "screen_feature_width"] = 1 # Minimal width is always 1
-        self.seq_features["label_width"] = self.seq_features.label.str.len()
-        self.seq_features["screen_render_width"] = self.seq_features.screen_feature_width
-        self.seq_features["screen_render_end"] = self.seq_features.screen_start  + self.seq_features.screen_render_width
-
-    def _assign_vertical_groups(self):
-        vertical_groups = pd.Series(
-            [-1] * len(self.seq_features),
-            index=self.seq_features.index
-        )
-
-        outer_start_time = time.time()
-        for group in range(len(self.seq_features)):
-            current_max = -1
-            for i, row in self.seq_features[vertical_groups == -1].iterrows():
-                if row.screen_start >= current_max:
-                    vertical_groups[i] = group
-                    current_max = row.screen_render_end
-
-            if current_max == -1:
-                break
-
-        print("--- Positions computed in %s seconds ---" % (time.time() - outer_start_time))
-        
-        self.seq_features["vertical_group"] = vertical_groups
+        if layout is None:
+            layout = self._new_layout(self.features, self.nt_per_square)
+            self.layout_cache.put(key, layout)
+
+        return layout
+
+    def _apply_layout(self, layout):
+        self.layout = layout
 
-    
 
     class Scrolled(Message):
         """Indicates that a scroll has happened"""
@@ -143,271 +247,67 @@ class FeatureViewer(ScrollView):
             super().__init__()
 
 
-    def _get_feature_segment(self, feature_width, segment_class=None, left_overflow=0, right_overflow=0, strand=0):
-        try:
-            rich_style = self.get_component_rich_style(f"featurevier--{segment_class}")
-        except KeyError:
-            # Given class is not defined
-            rich_style = self.get_component_rich_style("featurevier--default-feature")
-
-        displayed_feature_width = feature_width - left_overflow - right_overflow
-        displayed_feature_string = "━" * displayed_feature_width
-
-        if left_overflow > 0:
-            displayed_feature_string = "┅" + displayed_feature_string[1:]
-
-        if right_overflow > 0:
-            displayed_feature_string = displayed_feature_string[:-1] + "┅"
-
-        if feature_width == 1:
-            if strand == 1:
-                displayed_feature_string = "▶"
-            elif strand == -1:
-                displayed_feature_string = "◀"
-            else:
-                displayed_feature_string = "●"
+    def _query_visible_features(self, leftmost_position_cell, rightmost_position_cell):
+        if self.density_level is None:
+            return self.layout.viewport_index.query(leftmost_position_cell, rightmost_position_cell)
+
+        visible_features = self.position_index.query(leftmost_position_cell * self.nt_per_square, rightmost_position_cell * self.nt_per_square)
+        hidden_codes = self.features.type_codes(self.hidden_types)
+        if hidden_codes:
+            visible_features = visible_features[~np.isin(self.features.type_code[visible_features], hidden_codes)]
+        return visible_features
+
+    def _update_visible_features(self, leftmost_position_cell, rightmost_position_cell):
+        if self.density_level is not None:
+            # Densities don't depend on which features are visible, they are only looked up once scrolling settles
+            self._schedule_scrolled()
+            self._schedule_visible_features()
+            return
+
+        self._lay_out_visible_features(leftmost_position_cell, rightmost_position_cell)
+
+        # Signal the chagnge to other components
+        self._schedule_scrolled()
+        self._schedule_visible_features()
+
+    def _schedule_scrolled(self):
+        if self._scrolled_pending:
+            self.suppressed_updates["scrolled"] += 1
+            return
+        self._scrolled_pending = True
+        self.call_after_refresh(self._post_scrolled)
+
+    def _post_scrolled(self):
+        self._scrolled_pending = False
+        self.post_message(self.Scrolled(self.scroll_offset, self.nt_per_square, self.size.width - self.styles.scrollbar_size_vertical ))
+
+    def _schedule_visible_features(self):
+        self._last_viewport_change = time.monotonic()
+        if not self.visible_features_delay:
+            self._post_visible_features()
+        elif self._visible_features_pending:
+            self.suppressed_updates["visible_features"] += 1
         else:
-            if strand == 1 and left_overflow == 0:
-                displayed_feature_string = "╺" + displayed_feature_string[1:]
-            elif strand == -1 and right_overflow == 0:
-                displayed_feature_string = displayed_feature_string[1:] + "╸"
-
-
-        if displayed_feature_width > 1:
-            if strand == 1:
-                if right_overflow > 0:
-                    segments = [
-                        Segment(displayed_feature_string[:-2], rich_style),
-                        Segment("▶", rich_style),
-                        Segment(displayed_feature_string[-1], rich_style),
-                    ]
-                else:
-                    segments = [
-                        Segment(displayed_feature_string[:-1], rich_style),
-                        Segment("▶", rich_style),
-                    ]
-
-            elif strand == -1:
-                if left_overflow > 0:
-                    segments = [
-                        Segment(displayed_feature_string[0], rich_style),
-                        Segment("◀", rich_style),
-                        Segment(displayed_feature_string[2:], rich_style),
-                    ]
-                else:
-                    segments = [
-                        Segment("◀", rich_style),
-                        Segment(displayed_feature_string[1:], rich_style),
-                    ]
-            else:
-                segments = [Segment(displayed_feature_string, rich_style)]
-        else:
-            segments = [Segment(displayed_feature_string, rich_style)]
+            self._visible_features_pending = True
+            self.set_timer(self.visible_features_delay, self._settle_visible_features)
 
-        return segments
-    
+    def _settle_visible_features(self):
+        remaining = self._last_viewport_change + self.visible_features_delay - time.monotonic()
+        if remaining > 0:
+            # Still scrolling, wait until it settles
+            self.set_timer(remaining, self._settle_visible_features)
+            return
+        self._visible_features_pending = False
+        self._post_visible_features()
 
-    def _find_free_x_coordinate(self, feature, blocking_features, left_screen_bound, right_screen_bound):
-        candidate_x = max(feature.screen_start, left_screen_bound)
-
-        while candidate_x < min(feature.screen_end, right_screen_bound):
-            for _, feature_above in blocking_features.iterrows():
-                if feature_above.screen_start <= candidate_x < feature_above.screen_end:
-                    # One of the features is blocking this x coordinate
-                    candidate_x = feature_above.screen_end
-                    break 
-            else:
-                return candidate_x
-        
-        return -1
-
-    def _assign_vertical_label_groups(self, label_df):
-        vertical_groups = pd.Series(
-            [-1] * len(label_df),
-            index=label_df.index
-        )
-
-        # We are trying to center the features -> we have an equal number of rows above and below them
-        available_label_space = (self.virtual_size.height - self.features_within_bounds.vertical_group.max()) // 2 - 1
-
-        # List of first available position in each row
-        y_maxima = []
-
-        for i, row in label_df.iterrows():
-            feature_width = row.x_coord + row.label_width + 1
-
-            if not y_maxima:
-                # The first label to be placed
-                vertical_groups[i] = 0
-                y_maxima.append(feature_width)
-                continue
-
-            # We look at the rows from the reverse order (from the features out)
-            for y, maximum in enumerate(y_maxima[::-1]):
-                # And find one that we cannot place our label in
-                # We terminate the search at the first failure, because we need to draw not only the label, but also the stem
-                if row.x_coord < maximum:
-                    break
-            else:
-                y += 1
-            
-            if y == 0 and len(y_maxima) >= available_label_space:
-                # We run of available vertical space
-                continue
-
-            vertical_groups[i] = len(y_maxima) - y
-
-            if y == 0:
-                # If we failed at the bottommost row, we need to create a new row    
-                y_maxima.append(feature_width)
-            else:
-                # Otherwise we just update the fist available position in the row that the label fits
-                y_maxima[-(y)] = feature_width
-
-        label_df["vertical_group"] = vertical_groups
-        return label_df
-    
-    def _safely_postprocess_label_list(self, label_list):
-        if label_list:
-            labels_df = self._assign_vertical_label_groups(pd.DataFrame(label_list).sort_values("x_coord"))
-        else:
-            # No sroting can be done
-            labels_df = self._assign_vertical_label_groups(pd.DataFrame([]))
-        
-        # Drop labels that couldn't fit vertically
-        labels_df = labels_df[labels_df.vertical_group != -1]
-        return labels_df
-    
-    
-    def _compute_current_labels(self, left_screen_bound, right_screen_bound):
-        labels_above = []
-        labels_below = []
-
-        for _, feature in self.features_within_bounds.iterrows():
-            overlapping_features = self.features_within_bounds[
-                ~(
-                    (self.features_within_bounds.screen_start >= feature.screen_end) |
-                    (self.features_within_bounds.screen_end < feature.screen_start)
-                )
-            ]
-
-            features_above = overlapping_features[
-                (overlapping_features.vertical_group < feature.vertical_group)
-            ]
-            features_below = overlapping_features[
-                (overlapping_features.vertical_group > feature.vertical_group) 
-            ]
-
-            x_coord_above = self._find_free_x_coordinate(feature, features_above, left_screen_bound, right_screen_bound)
-            x_coord_below = self._find_free_x_coordinate(feature, features_below, left_screen_bound, right_screen_bound)
-
-            # Decide if the label should go above or below
-            if x_coord_above == -1:
-                if x_coord_below == -1:
-                    # No position found
-                    continue
-                else:
-                    labels_below.append({"x_coord":x_coord_below, "label":feature.label, "label_width":feature.label_width})
-            else:
-                if x_coord_below == -1:
-                    labels_above.append({"x_coord":x_coord_above, "label":feature.label, "label_width":feature.label_width})
-                else:
-                    # Leftmost available position
-                    if x_coord_above <= x_coord_below:
-                        labels_above.append({"x_coord":x_coord_above, "label":feature.label, "label_width":feature.label_width})
-                    else:
-                        labels_below.append({"x_coord":x_coord_below, "label":feature.label, "label_width":feature.label_width})
-        
-        labels_above_df = self._safely_postprocess_label_list(labels_above)
-        labels_below_df = self._safely_postprocess_label_list(labels_below)
-
-        return LabelTuple(labels_above_df, labels_below_df)
-    
-
-    def _render_feature_strip(self, features_to_render, leftmost_position_cell, rightmost_position_cell):
-        if features_to_render.empty:
-            return Strip.blank(self.size.width)
-
-        segments = []
-        current_position = leftmost_position_cell
-        
-        for _, row in features_to_render.iterrows():
-
-            if row.screen_start < leftmost_position_cell:
-                left_overflow = leftmost_position_cell - row.screen_start
-                right_overflow = max(row.screen_end - rightmost_position_cell, 0)
-
-            elif row.screen_end >= rightmost_position_cell:
-                segments.append(
-                    Segment(" " * (row.screen_start - current_position))
-                )
-                left_overflow = 0
-                right_overflow = row.screen_end - rightmost_position_cell
-                
-            else:
-                segments.append(
-                    Segment(" " * (row.screen_start - current_position))
-                )
-                left_overflow = right_overflow = 0
-
-
-            segments.extend(
-                self._get_feature_segment(
-                    row.screen_feature_width, 
-                    f"type-{row.feature_type.lower()}", 
-                    left_overflow=left_overflow,
-                    right_overflow=right_overflow,
-                    strand=row.strand
-                )
-            )
-                
-            current_position = row.screen_end
-
-
-        strip = Strip(segments)
-        return strip
-
-
-    def _render_label_strip(self, labels_to_render, stems_to_render, leftmost_position_cell, rightmost_position_cell):
-        if labels_to_render.empty and stems_to_render.empty:
-            return Strip.blank(self.size.width)
-
-        segments = []
-        current_position = leftmost_position_cell
-        label_style = self.get_component_rich_style("featurevier--label")
-
-        # We make stems look like labels and mix them in with the other labels
-        stems_df = pd.DataFrame({
-            "x_coord": stems_to_render.x_coord,
-            "label": "│",
-            "label_width": 1
-        })
-
-        mixed_df = pd.concat([
-            labels_to_render,
-            stems_df
-        ]).sort_values("x_coord", ascending=True)
-
-        for _, row in mixed_df.iterrows():
-            segments.append(
-                Segment(" " * (row.x_coord - current_position))
-            )
-
-            if row.x_coord + row.label_width >= rightmost_position_cell:
-                # Label goes out of screen -> we truncate it
-                segments.append(
-                    Segment(row.label[:rightmost_position_cell-(row.x_coord+row.label_width)-1] + "…", label_style)
-                )
-            else:
-                segments.append(
-                    Segment(row.label, label_style)
-                )
-            current_position = row.x_coord + row.label_width
-
-
-        strip = Strip(segments)
-        return strip
+    def _post_visible_features(self):
+        # Queried again, since the features may have changed since the update was scheduled
+        leftmost_position_cell = self.scroll_offset.x
+        rightmost_position_cell = leftmost_position_cell + self.size.width - self.styles.scrollbar_size_vertical
+        visible_features = self._query_visible_features(leftmost_position_cell, rightmost_position_cell)
 
+        self.features_within_bounds = self.seq_features.iloc[visible_features]
+        self.post_message(self.VisibleFeaturesChanged(self.features_within_bounds))
 
 
     def render_line(self, y: int) -> Strip:
@@ -419,47 +319,24 @@ class FeatureViewer(ScrollView):
         # First non-displayed cell; we need to substract the scrollbar width
         rightmost_position_cell = leftmost_position_cell + self.size.width - self.styles.scrollbar_size_vertical 
 
-        if y == scroll_y:
-            # Update which features are visible on the x axis
-            self.features_within_bounds = self.seq_features[
-                self.seq_features_interval_index.overlaps(pd.Interval(leftmost_position_cell, rightmost_position_cell, closed='left'))
-            ]
-            # Update which labels are visible
-            self.labels_within_bounds = self._compute_current_labels(leftmost_position_cell, rightmost_position_cell)
-
-            # Signal the chagnge to other components
-            self.post_message(self.Scrolled(self.scroll_offset, self.nt_per_square, self.size.width - self.styles.scrollbar_size_vertical ))
-            self.post_message(self.VisibleFeaturesChanged(self.features_within_bounds))
-
-        # # Adding constants to create spacing between features and labels
-        # last_label_above_row = self.labels_within_bounds.above.vertical_group.max() + 1
-        # last_feature_row = self.features_within_bounds.vertical_group.max() + last_label_above_row + 1
-        # last_label_below_row = self.labels_within_bounds.below.vertical_group.max() + last_feature_row + 1
-
-        last_label_above_row = (self.virtual_size.height - self.features_within_bounds.vertical_group.max()) // 2 - 1
-        first_label_above_row = max(last_label_above_row - self.labels_within_bounds.above.vertical_group.max() - 1, 0)
-
-        last_feature_row = self.features_within_bounds.vertical_group.max() + last_label_above_row + 1
-        last_label_below_row = self.labels_within_bounds.below.vertical_group.max() + last_feature_row + 1
-
-        if y <= last_label_above_row:
-            # We are rendering labels above
-            labels_to_render = self.labels_within_bounds.above[y == self.labels_within_bounds.above.vertical_group + first_label_above_row]
-            stems_to_render = self.labels_within_bounds.above[y > self.labels_within_bounds.above.vertical_group + first_label_above_row]
-            strip = self._render_label_strip(labels_to_render, stems_to_render, leftmost_position_cell, rightmost_position_cell)
-        
-        elif y <= last_feature_row:
-            # We are rendering features
-            features_to_render = self.features_within_bounds[
-                (y == self.features_within_bounds.vertical_group + last_label_above_row + 1)
-            ]
-            strip = self._render_feature_strip(features_to_render, leftmost_position_cell, rightmost_position_cell)
+        # Everything that decides what the lines look like, except for the row itself
+        viewport = (scroll_x, self.nt_per_square, self.size.width, self.virtual_size.height, self.layout_version)
+
+        if viewport != self._current_viewport:
+            self._update_visible_features(leftmost_position_cell, rightmost_position_cell)
+            self._current_viewport = viewport
+
+        cache_key = (viewport, y)
+        strip = self.strip_cache.get(cache_key)
+
+        if strip is None:
+            strip = self._render_row(y, leftmost_position_cell, rightmost_position_cell)
+            self.strip_cache[cache_key] = strip
+            if len(self.strip_cache) > self.strip_cache_size:
+                self.strip_cache.popitem(last=False)
         else:
-            # We are rendering labels below
-            labels_to_render = self.labels_within_bounds.below[y == last_label_below_row - self.labels_within_bounds.below.vertical_group + 1]
-            stems_to_render = self.labels_within_bounds.below[y < (last_label_below_row - self.labels_within_bounds.below.vertical_group + 1)]
-            strip = self._render_label_strip(labels_to_render, stems_to_render, leftmost_position_cell, rightmost_position_cell)
-        
+            self.strip_cache.move_to_end(cache_key)
+
         return strip
 
 
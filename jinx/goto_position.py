@@ -3,6 +3,16 @@ from textual.widgets import Input, Label
 from textual.containers import Vertical
 from textual.screen import ModalScreen
 from textual.validation import Validator, ValidationResult
+from textual.suggester import Suggester
+
+from rich.markup import escape
+
+
+def parse_position(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
 
 
 class GotoValidator(Validator):
@@ -11,10 +21,9 @@ class GotoValidator(Validator):
         super().__init__()
 
     def validate(self, value: str) -> ValidationResult:
-        try:
-            coord = int(value)
-        except ValueError:
-            return self.failure("Not a valid position")
+        coord = parse_position(value)
+        if coord is None:
+            return self.validate_name(value)
 
         if self.is_in_range(coord):
             return self.success()
@@ -24,6 +33,29 @@ class GotoValidator(Validator):
     def is_in_range(self, value: int) -> bool:
         return 1 <= value <= self.app.get_current_locus_length()
 
+    def validate_name(self, value: str) -> ValidationResult:
+        if self.app.key_index is None:
+            return self.failure("Features can be found by name once the file is loaded")
+        if value not in self.app.key_index:
+            return self.failure("No feature with this locus tag, gene, protein id or db_xref")
+        return self.success()
+
+
+class FeatureNameSuggester(Suggester):
+    """
+    Completes feature names from the key index of the app
+    """
+
+    def __init__(self, app):
+        self.app = app
+        super().__init__(use_cache=False)
+
+    async def get_suggestion(self, value: str):
+        if self.app.key_index is None or parse_position(value) is not None:
+            return None
+        completions = self.app.key_index.complete(value, limit=1)
+        return completions[0] if completions else None
+
 
 class GotoPositionScreen(ModalScreen):
     BINDINGS = [
@@ -38,11 +70,12 @@ class GotoPositionScreen(ModalScreen):
         with Vertical(id="goto-container"):
             yield Input(
                 id="goto-input", 
-                placeholder="Go to position",
+                placeholder="Go to position, or to a feature by locus tag, gene, protein id or db_xref",
                 valid_empty=False,
-                validators=GotoValidator(app=self.app)
+                validators=GotoValidator(app=self.app),
+                suggester=FeatureNameSuggester(app=self.app),
             )
-            yield Label("[blue]Enter a coordinate", id="goto-message")
+            yield Label("[blue]Enter a coordinate or a feature name", id="goto-message")
 
     def action_close_screen(self):
         self.dismiss(None)
@@ -52,14 +85,20 @@ class GotoPositionScreen(ModalScreen):
         self.is_valid = event.validation_result is None or event.validation_result.is_valid
 
         if not self.is_valid:  
-            self.query_one(Label).update("/".join(event.validation_result.failure_descriptions))
+            message = "/".join(event.validation_result.failure_descriptions)
+            completions = self.app.key_index.complete(event.value) if self.app.key_index is not None else []
+            if completions and parse_position(event.value) is None:
+                message += "\n[blue]" + escape(", ".join(completions))
+            self.query_one(Label).update(message)
         else:
             self.query_one(Label).update("")
 
     def on_input_submitted(self):
         if self.is_valid:
-            submitted_value = int(self.query_one("#goto-input").value)
-            self.dismiss(submitted_value)
+            # Either a position or the name of a feature
+            submitted_value = self.query_one("#goto-input").value
+            position = parse_position(submitted_value)
+            self.dismiss(submitted_value if position is None else position)
 
         else:
             self.dismiss(None)
@@ -8,11 +8,27 @@ from local_viewport import LocalViewport
 from feature_viewer import FeatureViewer
 from data_viewer import DataViewer
 from goto_position import GotoPositionScreen
+from feature_types import FeatureTypesScreen
 from help_screen import HelpScreen
 
-from parsers import parse_genbank
+from loading_screen import LoadingScreen
 
+from parsers import feature_table, locus_table
+from feature_store import compact_feature_columns, LocusFeatureTable
+from search_index import QualifierIndex, KeyIndex
+from parse_cache import file_fingerprint, load_cache, save_cache
+import render
+from workspace import GENBANK_PARSERS, expand_paths, file_labels, iter_genbank_parallel, load_genbank, process_pool, workspace_tables
+
+from textual import work
+from textual.worker import get_current_worker
+
+from concurrent.futures import as_completed
+import pandas as pd
+import argparse
+import os
 import sys
+import time
 
 
 class ViewerScreen(Screen):
@@ -26,6 +42,7 @@ class ViewerScreen(Screen):
             seq_features=self.app.get_current_locus_data(),
             genome_length=self.app.get_current_locus_length(), 
             nt_per_square=64,
+            locus=self.app.current_locus,
         )
         yield DataViewer()
         yield Footer()
@@ -37,11 +54,7 @@ class ViewerScreen(Screen):
         self.query_one("#visible-features").display_features(event.visible_features)
     
     def on_text_search_search_result_selected(self, event):
-        self.query_one(FeatureViewer).go_to_location(
-            # Need an explicit conversion to int, because otherwise the animation breaks
-            int(event.feature.start),  
-            where="middle"
-        )
+        self.app.show_feature(event.feature)
 
 class JinxApp(App):
     TITLE = "Jinx"
@@ -52,52 +65,229 @@ class JinxApp(App):
         ("l", "open_locus_selector()", "Loci"),
         ("/", "open_search()", "Search qualifiers"),
         (":", "open_goto()", "Go to position"),
+        ("t", "open_feature_types()", "Feature types"),
         ("?", "open_help()", "Help"),
         ("q", "quit()", "Quit"),
     ]
 
-    def __init__(self, path):
+    def __init__(self, paths, use_cache=True, parser="biopython", max_workers=None):
         super().__init__()
-        self.load_data(path)
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.use_cache = use_cache
+        self.parser = parser
+        self.max_workers = max_workers
+
+        # Filled in by the loading worker as the file is parsed
+        self.locus_features = LocusFeatureTable()
+        self.locus_data = locus_table([])
+        self.current_locus = None
+        self.search_index = None
+        self.key_index = None
+        self.hidden_types = frozenset()
+
+    @work(thread=True, exclusive=True, group="loading")
+    def load_data(self, paths):
+        if len(paths) == 1:
+            self._load_file(paths[0])
+        else:
+            self._load_workspace(paths)
+
+    def _load_file(self, path):
+        total_bytes = os.path.getsize(path)
+
+        if self.use_cache:
+            fingerprint = file_fingerprint(path, self.parser)
+            cached = load_cache(path, fingerprint)
+
+            if cached is not None:
+                feature_data, locus_data = cached
+                self.call_from_thread(self.add_loci, feature_data, locus_data)
+                self._index_and_finish(feature_data, total_bytes, len(locus_data))
+                return
+
+        feature_data, locus_data = self._parse_progressively(path, total_bytes)
+        self._index_and_finish(feature_data, total_bytes, len(locus_data))
+
+        if self.use_cache:
+            save_cache(path, fingerprint, feature_data, locus_data)
+
+    def _load_workspace(self, paths):
+        """
+        Parse several files at once in worker processes. Loci are keyed by file and locus,
+        and the loci of each file are handed over as soon as its worker finishes.
+        """
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        labels = file_labels(paths)
+        feature_frames, locus_frames = [], []
+        bytes_read = 0
+
+        # Files are already parsed in parallel, so each of them is parsed by a single worker
+        parser = "fast" if self.parser == "parallel" else self.parser
+
+        with process_pool(self.max_workers) as executor:
+            futures = {executor.submit(load_genbank, path, parser, self.use_cache): path for path in paths}
+
+            for future in as_completed(futures):
+                path = futures[future]
+                bytes_read += os.path.getsize(path)
+
+                try:
+                    feature_data, locus_data = future.result()
+                except Exception as error:
+                    self.call_from_thread(self.notify, f"Could not load {path}: {error}", severity="error")
+                    continue
+
+                feature_data, locus_data = workspace_tables(path, labels[path], feature_data, locus_data, sum(map(len, feature_frames)))
+
+                self.call_from_thread(self.add_loci, feature_data, locus_data)
+                self.call_from_thread(self.show_loading_progress, bytes_read, total_bytes, sum(map(len, locus_frames)) + len(locus_data))
+                feature_frames.append(feature_data)
+                locus_frames.append(locus_data)
+
+        if feature_frames:
+            feature_data = compact_feature_columns(pd.concat(feature_frames))
+        else:
+            feature_data = feature_table([])
+        self._index_and_finish(feature_data, total_bytes, sum(map(len, locus_frames)))
+
+    def _index_and_finish(self, feature_data, total_bytes, loci_parsed):
+        # The search indices cover all loci, so they can only be built at the end
+        self.call_from_thread(
+            self.finish_loading,
+            QualifierIndex(feature_data), KeyIndex(feature_data), self.locus_features.merged(), total_bytes, loci_parsed
+        )
+
+    def _parse_progressively(self, path, total_bytes, update_interval=0.25):
+        """
+        Parse the file, handing the first locus over as soon as it is parsed and the rest in batches,
+        so that the viewer can be used while the file is still loading.
+        """
+        feature_rows, locus_rows = [], []
+        feature_frames, locus_frames = [], []
+        loci_parsed = 0
+        last_update = time.monotonic()
+
+        if self.parser == "parallel":
+            records = iter_genbank_parallel(path, self.max_workers)
+        else:
+            records = GENBANK_PARSERS[self.parser](path)
+
+        for locus_row, record_feature_rows, bytes_read in records:
+            locus_rows.append(locus_row)
+            feature_rows.extend(record_feature_rows)
+            loci_parsed += 1
+
+            if loci_parsed == 1 or time.monotonic() - last_update > update_interval:
+                self._hand_over_loci(feature_rows, locus_rows, feature_frames, locus_frames)
+                self.call_from_thread(self.show_loading_progress, bytes_read, total_bytes, loci_parsed)
+                feature_rows, locus_rows = [], []
+                last_update = time.monotonic()
+
+        if locus_rows:
+            self._hand_over_loci(feature_rows, locus_rows, feature_frames, locus_frames)
+
+        if not locus_frames:
+            return feature_table([]), locus_table([])
+        return compact_feature_columns(pd.concat(feature_frames)), pd.concat(locus_frames)
+
+    def _hand_over_loci(self, feature_rows, locus_rows, feature_frames, locus_frames):
+        feature_data = feature_table(feature_rows)
+        # The index identifies features, so it has to be unique across batches
+        feature_data.index += sum(map(len, feature_frames))
+        locus_data = locus_table(locus_rows)
+
+        self.call_from_thread(self.add_loci, feature_data, locus_data)
+        feature_frames.append(feature_data)
+        locus_frames.append(locus_data)
+
+    def add_loci(self, feature_data, locus_data):
+        self.locus_features.add(feature_data)
+
+        if self.locus_data.empty:
+            self.locus_data = locus_data
+        else:
+            self.locus_data = pd.concat([self.locus_data, locus_data])
 
-    def determine_labels(self, feature_data):
-        current_labels = feature_data.label.copy()
-        current_labels.loc[current_labels == "no_label"] = feature_data.gene.loc[current_labels == "no_label"]
-        current_labels.loc[current_labels == "no_gene_name"] = feature_data["product"].loc[current_labels == "no_gene_name"]
-        current_labels.loc[current_labels == "no_product"] = feature_data.locus_tag.loc[current_labels == "no_product"]
-        current_labels.loc[current_labels == "no_tag"] = feature_data.feature_type.loc[current_labels == "no_tag"] + " <no label>"
-        return current_labels
+        if self.current_locus is None:
+            # The first locus is ready, we can show the viewer
+            self.current_locus = self.locus_data.index[0]
+            self.install_screen(ViewerScreen(), name="viewer")
+            self.switch_screen("viewer")
+        else:
+            self.get_screen("viewer").query_one(DataViewer).add_loci(locus_data)
 
-    def load_data(self, path):
-        feature_data, locus_data = parse_genbank(path)
-        feature_data["label"] = self.determine_labels(feature_data)
+    def show_loading_progress(self, bytes_read, total_bytes, loci_parsed):
+        if self.current_locus is None:
+            self.get_screen("loading").show_progress(bytes_read, total_bytes, loci_parsed)
+        else:
+            self.sub_title = f"Loading… {bytes_read / 2**20:.1f}/{total_bytes / 2**20:.1f} MB, {loci_parsed} loci"
 
-        self.feature_data = feature_data.groupby("locus")
-        self.locus_data = locus_data
-        self.current_locus = self.locus_data.index[0]
+    def finish_loading(self, search_index, key_index, locus_features, total_bytes, loci_parsed):
+        self.search_index = search_index
+        self.key_index = key_index
+        # The batches of loci handed over while loading, merged into a single table
+        self.locus_features = locus_features
+
+        if self.current_locus is None:
+            self.get_screen("loading").show_message("[red]No records found in the file")
+        else:
+            self.sub_title = ""
 
     def get_current_locus_data(self):
-        return self.feature_data.get_group(self.current_locus)
+        locus_features = self.locus_features.features(self.current_locus)
+        if locus_features is None:
+            # Locus without any features
+            return feature_table([])
+        return locus_features
     
     def get_current_locus_length(self):
-        print( self.locus_data.loc[self.current_locus, "sequence_length"] )
         return int(self.locus_data.loc[self.current_locus, "sequence_length"])
     
     
+    def check_action(self, action, parameters):
+        if action in ("quit", "open_help"):
+            return True
+        # Everything else needs the viewer, which is only shown once the first locus is loaded
+        return self.current_locus is not None
+
     def on_mount(self) -> None:
-        self.install_screen(ViewerScreen(), name="viewer")
+        self.install_screen(LoadingScreen(), name="loading")
         self.install_screen(GotoPositionScreen(), name="goto")
         self.install_screen(HelpScreen(), name="help")
-        self.push_screen('viewer')
+        self.push_screen('loading')
+        self.load_data(self.paths)
 
 
     def on_locus_switcher_change_current_locus(self, event):
-        self.current_locus = self.locus_data.index[event.locus_index]
-        print(self.current_locus)
+        self.change_locus(self.locus_data.index[event.locus_index])
+
+    def on_locus_switcher_locus_highlighted(self, event):
+        self.warm_up_loci(self.query_one(FeatureViewer), event.locus_index)
+
+    @work(thread=True, exclusive=True, group="warm-up")
+    def warm_up_loci(self, feature_viewer, locus_index):
+        """
+        Prepare the locus highlighted in the switcher and its neighbours, so that selecting them is immediate
+        """
+        for index in (locus_index, locus_index + 1, locus_index - 1):
+            if get_current_worker().is_cancelled:
+                # The cursor moved on
+                return
+            if not 0 <= index < len(self.locus_data):
+                continue
+
+            locus = self.locus_data.index[index]
+            locus_features = self.locus_features.features(locus)
+            if locus != self.current_locus and locus_features is not None:
+                feature_viewer.warm_up(locus, locus_features, int(self.locus_data.sequence_length.iloc[index]))
+
+    def change_locus(self, locus):
+        self.current_locus = locus
 
         self.query_one(FeatureViewer).change_visible_features(
             genome_length=self.get_current_locus_length(),
-            seq_features=self.get_current_locus_data()
+            seq_features=self.get_current_locus_data(),
+            locus=self.current_locus
         )
 
         self.query_one(LocalViewport).border_title = self.app.current_locus
@@ -113,17 +303,43 @@ class JinxApp(App):
     def action_open_locus_selector(self):
         self.query_one(DataViewer).show_locus_switcher()
 
-    def evaluate_goto(self, goto_result: int):
+    def show_feature(self, feature):
+        if feature.locus != self.current_locus:
+            # Features may come from any locus
+            self.change_locus(feature.locus)
+
+        self.query_one(FeatureViewer).go_to_location(
+            # Need an explicit conversion to int, because otherwise the animation breaks
+            int(feature.start),
+            where="middle"
+        )
+
+    def evaluate_goto(self, goto_result):
         # The result should be validated by the GoTo input itself
         if goto_result is None:
             return
 
+        if isinstance(goto_result, str):
+            # A feature name, features of the current locus go first if several have it
+            features = self.key_index.lookup(goto_result)
+            in_current_locus = features[features.locus == self.current_locus]
+            self.show_feature((in_current_locus if len(in_current_locus) else features).iloc[0])
+            return
+
         feature_viewer = self.query_one(FeatureViewer)
         feature_viewer.scroll_to((goto_result-1) // feature_viewer.nt_per_square, duration=0.5)
         
     def action_open_goto(self):
         self.push_screen('goto', self.evaluate_goto)
 
+    def action_open_feature_types(self):
+        self.push_screen(FeatureTypesScreen(self.locus_features.feature_types(), self.hidden_types))
+
+    def on_feature_types_screen_hidden_types_changed(self, event):
+        self.hidden_types = event.hidden_types
+        # The feature types screen is on top of the viewer
+        self.get_screen("viewer").query_one(FeatureViewer).hide_feature_types(self.hidden_types)
+
     def action_open_help(self):
         self.push_screen('help')
 
@@ -142,6 +358,21 @@ class JinxApp(App):
 
 if __name__ == "__main__":
 
-    app = JinxApp(sys.argv[1])
+    if sys.argv[1:2] == ["render"]:
+        # Headless rendering of regions, without starting the app
+        sys.exit(render.main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Interactive terminal-based viewer for genbank files")
+    parser.add_argument("paths", nargs="+", help="genbank files to open; directories and glob patterns are expanded")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the parsed file cache")
+    parser.add_argument("--parser", choices=GENBANK_PARSERS, default="biopython", help="genbank parser to use (default: biopython)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes parsing files, or records of a file with --parser parallel (default: one per CPU)")
+    args = parser.parse_args()
+
+    paths = expand_paths(args.paths)
+    if not paths:
+        parser.error("no genbank files found")
+
+    app = JinxApp(paths, use_cache=not args.no_cache, parser=args.parser, max_workers=args.workers)
     app.run()
 
@@ -0,0 +1,145 @@
+from collections import namedtuple
+
+import numpy as np
+
+PlacedLabels = namedtuple("PlacedLabels", ["feature", "x_coord", "vertical_group"])
+LabelPlacement = namedtuple("LabelPlacement", ["above", "below"])
+
+
+def _next_free_x(blocked):
+    """
+    For every row and x coordinate of a boolean coverage matrix, find the first x at or
+    after it that is not blocked. Positions with no free x to their right get the width.
+    """
+    width = blocked.shape[1]
+    free_x = np.where(blocked, width, np.arange(width))
+    return np.minimum.accumulate(free_x[:, ::-1], axis=1)[:, ::-1]
+
+
+def find_free_x_coordinates(screen_start, screen_end, vertical_group, left_screen_bound, right_screen_bound):
+    """
+    For every feature, find the leftmost x coordinate within both the feature and the screen
+    that is not covered by any feature in the rows above it, and the same for the rows below it.
+    Returns two arrays of x coordinates, with -1 where there is no free position.
+
+    The coverage of each row is computed with a single sweep over the screen width
+    (a difference array summed along x), then accumulated across the rows.
+    """
+    screen_start = np.asarray(screen_start, dtype=np.int64)
+    screen_end = np.asarray(screen_end, dtype=np.int64)
+    vertical_group = np.asarray(vertical_group, dtype=np.int64)
+
+    width = right_screen_bound - left_screen_bound
+    if len(screen_start) == 0 or width <= 0:
+        no_position = np.full(len(screen_start), -1, dtype=np.int64)
+        return no_position, no_position.copy()
+
+    row_count = vertical_group.max() + 1
+    local_start = np.clip(screen_start - left_screen_bound, 0, width)
+    local_end = np.clip(screen_end - left_screen_bound, 0, width)
+
+    # Number of features covering each screen cell, per row
+    coverage = np.zeros((row_count, width + 1), dtype=np.int32)
+    np.add.at(coverage, (vertical_group, local_start), 1)
+    np.add.at(coverage, (vertical_group, local_end), -1)
+    coverage = np.cumsum(coverage[:, :-1], axis=1)
+
+    # Coverage of all rows above (smaller vertical group) and below (larger vertical group) a row
+    cumulative_coverage = np.zeros((row_count + 1, width), dtype=np.int32)
+    np.cumsum(coverage, axis=0, out=cumulative_coverage[1:])
+    covered_above = cumulative_coverage[:-1] > 0
+    covered_below = (cumulative_coverage[-1] - cumulative_coverage[1:]) > 0
+
+    candidate_x = np.minimum(local_start, width - 1)
+    last_x = local_end  # First x that is not available anymore
+
+    x_above = _next_free_x(covered_above)[vertical_group, candidate_x]
+    x_below = _next_free_x(covered_below)[vertical_group, candidate_x]
+
+    x_above = np.where(x_above < last_x, x_above + left_screen_bound, -1)
+    x_below = np.where(x_below < last_x, x_below + left_screen_bound, -1)
+
+    return x_above, x_below
+
+
+def assign_vertical_label_groups(x_coord, label_width, available_label_space):
+    """
+    Stack labels (ordered by x_coord) into rows. Rows are searched from the features
+    outwards and a label is placed in the outermost row of the uninterrupted run of rows
+    it fits into, so that there is free space for its stem. Labels that would need more
+    than available_label_space rows get -1.
+    """
+    vertical_groups = np.full(len(x_coord), -1, dtype=np.int64)
+
+    # List of first available position in each row
+    y_maxima = []
+
+    for i, (x, width) in enumerate(zip(np.asarray(x_coord).tolist(), np.asarray(label_width).tolist())):
+        label_end = x + width + 1
+
+        if not y_maxima:
+            # The first label to be placed
+            vertical_groups[i] = 0
+            y_maxima.append(label_end)
+            continue
+
+        # We look at the rows from the reverse order (from the features out)
+        # and count the rows the label fits in until the first one it doesn't
+        y = 0
+        for maximum in reversed(y_maxima):
+            if x < maximum:
+                break
+            y += 1
+
+        if y == 0 and len(y_maxima) >= available_label_space:
+            # We run out of available vertical space
+            continue
+
+        vertical_groups[i] = len(y_maxima) - y
+
+        if y == 0:
+            # If we failed at the bottommost row, we need to create a new row
+            y_maxima.append(label_end)
+        else:
+            # Otherwise we just update the first available position in the row that the label fits
+            y_maxima[-y] = label_end
+
+    return vertical_groups
+
+
+def _stack_labels(feature, x_coord, label_width, available_label_space):
+    order = np.argsort(x_coord, kind="stable")
+    feature = feature[order]
+    x_coord = x_coord[order]
+
+    vertical_group = assign_vertical_label_groups(x_coord, label_width[feature], available_label_space)
+
+    # Drop labels that couldn't fit vertically
+    placed = vertical_group != -1
+    return PlacedLabels(feature[placed], x_coord[placed], vertical_group[placed])
+
+
+def place_labels(screen_start, screen_end, vertical_group, label_width, left_screen_bound, right_screen_bound, available_label_space):
+    """
+    Decide where the labels of the given features are drawn.
+
+    Each label goes above or below its feature, whichever offers a free x coordinate
+    further left (above wins ties), and is then stacked into label rows.
+    Returns a LabelPlacement of PlacedLabels, with positions into the input arrays.
+    """
+    label_width = np.asarray(label_width, dtype=np.int64)
+
+    x_above, x_below = find_free_x_coordinates(
+        screen_start, screen_end, vertical_group, left_screen_bound, right_screen_bound
+    )
+
+    goes_above = (x_above != -1) & ((x_below == -1) | (x_above <= x_below))
+    goes_below = (x_below != -1) & ~goes_above
+
+    above = np.flatnonzero(goes_above)
+    below = np.flatnonzero(goes_below)
+
+    return LabelPlacement(
+        _stack_labels(above, x_above[above], label_width, available_label_space),
+        _stack_labels(below, x_below[below], label_width, available_label_space),
+    )
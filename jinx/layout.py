@@ -0,0 +1,213 @@
+import heapq
+from collections import OrderedDict
+
+import numpy as np
+
+
+def assign_vertical_groups(screen_start, screen_end):
+    """
+    Greedily pack features into rows, so that no two features in a row overlap.
+
+    Every feature goes to the lowest row whose last feature ends before the
+    feature starts, which is the same result as filling the rows one by one
+    from left to right. Done in a single sweep over the features ordered by
+    their start, keeping a min-heap of row ends and a min-heap of free rows.
+    """
+    screen_start = np.asarray(screen_start)
+    screen_end = np.asarray(screen_end)
+
+    vertical_groups = np.full(len(screen_start), -1, dtype=np.int64)
+    order = np.argsort(screen_start, kind="stable")
+
+    occupied_rows = []  # (end of the last feature in the row, row)
+    free_rows = []
+    row_count = 0
+
+    for i, start, end in zip(order.tolist(), screen_start[order].tolist(), screen_end[order].tolist()):
+        # Release all rows that are free at the start of the current feature
+        while occupied_rows and occupied_rows[0][0] <= start:
+            heapq.heappush(free_rows, heapq.heappop(occupied_rows)[1])
+
+        if free_rows:
+            row = heapq.heappop(free_rows)
+        else:
+            row = row_count
+            row_count += 1
+
+        vertical_groups[i] = row
+        heapq.heappush(occupied_rows, (end, row))
+
+    return vertical_groups
+
+
+class IntervalQuery:
+    """
+    Finds the half-open intervals [start, end) overlapping a half-open query range.
+
+    Intervals are binned by their length, rounded up to a power of two, and sorted by
+    their start within each bin. An interval of at most 2**b overlaps the query only if
+    it starts in [left - 2**b, right), which is one pair of binary searches per bin.
+    The intervals found this way either overlap the query or are at most twice as long
+    as the distance by which they miss it, so long intervals such as the source feature
+    spanning a whole locus don't make every query scan all features.
+    A query costs O(b log n + k) for b bins and k hits in the usual case.
+    If the intervals are a subset of a larger table, their increasing positions
+    in it can be given, and queries then return these positions instead.
+    """
+
+    def __init__(self, start, end, positions=None):
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        self.positions = positions
+
+        # Smallest b such that the interval is at most 2**b long
+        lengths = np.maximum(end - start, 1)
+        length_bins = np.ceil(np.log2(lengths)).astype(np.int64)
+        # Guard against rounding in log2 for large powers of two
+        length_bins += (np.left_shift(1, length_bins) < lengths)
+
+        self.order = np.lexsort((start, length_bins))
+        self.start = start[self.order]
+        self.end = end[self.order]
+
+        sorted_bins = length_bins[self.order]
+        self.bins = np.unique(sorted_bins).tolist()
+        self.bin_offsets = np.searchsorted(sorted_bins, self.bins + [self.bins[-1] + 1 if self.bins else 0]).tolist()
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def nbytes(self):
+        positions_nbytes = 0 if self.positions is None else self.positions.nbytes
+        return self.start.nbytes + self.end.nbytes + self.order.nbytes + positions_nbytes
+
+    def query(self, left, right):
+        """
+        Return the positions (in the original order) of intervals overlapping [left, right)
+        """
+        candidates = []
+        for i, length_bin in enumerate(self.bins):
+            bin_first, bin_last = self.bin_offsets[i], self.bin_offsets[i + 1]
+            bin_start = self.start[bin_first:bin_last]
+            first = bin_first + np.searchsorted(bin_start, left - (1 << length_bin), side="right")
+            last = bin_first + np.searchsorted(bin_start, right, side="left")
+            if first < last:
+                candidates.append(np.arange(first, last))
+
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.concatenate(candidates)
+        hits = np.sort(self.order[candidates[self.end[candidates] > left]])
+        if self.positions is not None:
+            hits = self.positions[hits]
+        return hits
+
+
+class FeatureLayout:
+    """
+    Screen positions and rows of the features of a locus at a single zoom level.
+    Arrays follow the order of the features the layout was computed from.
+    If only some rows (in increasing order) are given, only these features are packed into rows and found by queries,
+    the others keep a vertical group of -1.
+    """
+
+    def __init__(self, start, end, nt_per_square, rows=None):
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+
+        self.nt_per_square = nt_per_square
+        self.rows = rows
+        self.screen_start = start // nt_per_square
+        self.screen_end = (end - 1) // nt_per_square + 1  # We add one, because the end is not inclusive
+        self.screen_feature_width = np.maximum(self.screen_end - self.screen_start, 1)  # Minimal width is always 1
+        self.screen_render_end = self.screen_start + self.screen_feature_width
+
+        if rows is None:
+            self.vertical_group = assign_vertical_groups(self.screen_start, self.screen_render_end)
+            self.viewport_index = IntervalQuery(self.screen_start, self.screen_end)
+        else:
+            self.vertical_group = np.full(len(start), -1, dtype=np.int64)
+            self.vertical_group[rows] = assign_vertical_groups(self.screen_start[rows], self.screen_render_end[rows])
+            self.viewport_index = IntervalQuery(self.screen_start[rows], self.screen_end[rows], positions=rows)
+
+        # Features grouped by row, ordered by their start within each row
+        self.row_order = np.argsort(self.vertical_group, kind="stable")
+        self.row_offsets = np.searchsorted(
+            self.vertical_group[self.row_order],
+            np.arange(self.row_count + 1)
+        )
+        self._row_start = self.screen_start[self.row_order]
+        self._row_render_end = self.screen_render_end[self.row_order]
+
+    @property
+    def row_count(self):
+        return int(self.vertical_group.max()) + 1 if len(self.vertical_group) else 0
+
+    @property
+    def nbytes(self):
+        return (
+            self.screen_start.nbytes + self.screen_end.nbytes + self.screen_feature_width.nbytes
+            + self.screen_render_end.nbytes + self.vertical_group.nbytes
+            + self.viewport_index.nbytes + self.row_order.nbytes + self.row_offsets.nbytes
+            + self._row_start.nbytes + self._row_render_end.nbytes
+        )
+
+    def row_features(self, row, left, right):
+        """
+        Return the positions of features in the given row that overlap [left, right), ordered by start
+        """
+        if not 0 <= row < self.row_count:
+            return self.row_order[:0]
+
+        row_first, row_last = self.row_offsets[row], self.row_offsets[row + 1]
+        # Features in a row don't overlap, so both their starts and ends are sorted
+        first = row_first + np.searchsorted(self._row_render_end[row_first:row_last], left, side="right")
+        last = row_first + np.searchsorted(self._row_start[row_first:row_last], right, side="left")
+        return self.row_order[first:last]
+
+
+class LayoutCache:
+    """
+    LRU cache of finished layouts, bounded by the number of entries and optionally by their total size in bytes
+    """
+
+    def __init__(self, max_entries=32, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._layouts = OrderedDict()
+
+    def __len__(self):
+        return len(self._layouts)
+
+    def __contains__(self, key):
+        return key in self._layouts
+
+    def get(self, key):
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._layouts.move_to_end(key)
+        return layout
+
+    def put(self, key, layout):
+        if key in self._layouts:
+            self.total_bytes -= self._layouts.pop(key).nbytes
+
+        self._layouts[key] = layout
+        self.total_bytes += layout.nbytes
+        self._evict()
+
+    def clear(self):
+        self._layouts.clear()
+        self.total_bytes = 0
+
+    def _evict(self):
+        # The most recently added layout is always kept, even if it alone exceeds the byte limit
+        while len(self._layouts) > 1 and (
+            len(self._layouts) > self.max_entries or
+            (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            _, layout = self._layouts.popitem(last=False)
+            self.total_bytes -= layout.nbytes
@@ -0,0 +1,21 @@
+from textual.app import ComposeResult
+from textual.screen import Screen
+from textual.widgets import Label, ProgressBar
+from textual.containers import Vertical
+
+
+class LoadingScreen(Screen):
+
+    def compose(self) -> ComposeResult:
+        with Vertical(id="loading-container"):
+            yield Label("[blue]Loading…", id="loading-message")
+            yield ProgressBar(id="loading-progress", show_eta=False)
+
+    def show_progress(self, bytes_read, total_bytes, loci_parsed):
+        self.query_one(ProgressBar).update(total=total_bytes, progress=bytes_read)
+        self.query_one(Label).update(
+            f"[blue]Loading… {bytes_read / 2**20:.1f}/{total_bytes / 2**20:.1f} MB, {loci_parsed} loci parsed"
+        )
+
+    def show_message(self, message):
+        self.query_one(Label).update(message)
@@ -0,0 +1,85 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+LENGTH_FILTER = re.compile(r"([<>]=?)(\d+(?:\.\d+)?)([kKmMgG]?)")
+LENGTH_UNITS = {"": 1, "k": 10**3, "m": 10**6, "g": 10**9}
+
+
+class LocusIndex:
+    """
+    Lightweight copy of the columns of the locus table which the locus switcher shows: id, name and length.
+    Rows follow the order of the locus table; sorting and filtering return positions in it.
+    """
+
+    COLUMNS = ["locus_id", "name", "sequence_length"]
+
+    def __init__(self):
+        self.locus_ids = pd.Series([], dtype=object)
+        self.names = pd.Series([], dtype=object)
+        self.lengths = np.empty(0, dtype=np.int64)
+        # Sort orders by column, computed on demand
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def sync(self, locus_data):
+        """
+        Add the loci of the locus table which are not indexed yet
+        """
+        new_loci = locus_data.iloc[len(self):]
+        if new_loci.empty:
+            return
+
+        self.locus_ids = pd.concat([self.locus_ids, pd.Series(new_loci.index.astype(str), dtype=object)], ignore_index=True)
+        self.names = pd.concat([self.names, pd.Series(new_loci.name.astype(str).to_numpy(), dtype=object)], ignore_index=True)
+        self.lengths = np.concatenate([self.lengths, new_loci.sequence_length.to_numpy(dtype=np.int64)])
+        self._orders.clear()
+
+    def column(self, column):
+        return {"locus_id": self.locus_ids, "name": self.names, "sequence_length": self.lengths}[column]
+
+    def column_width(self, column):
+        if column == "sequence_length":
+            return len(f"{self.lengths.max():,}") if len(self) else 0
+        return int(self.column(column).str.len().max()) if len(self) else 0
+
+    def _order(self, column):
+        if column not in self._orders:
+            values = self.column(column)
+            self._orders[column] = np.argsort(np.asarray(values), kind="stable")
+        return self._orders[column]
+
+    def rows(self, sort_column=None, descending=False, query=""):
+        """
+        Return the positions of the loci matching the query, ordered by a column.
+        The query is made of words which must all match: text is looked for in the ids and names,
+        while words like >10k or <=2.5M filter by length.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for word in query.split():
+            length_filter = LENGTH_FILTER.fullmatch(word)
+            if length_filter is not None:
+                operator, number, unit = length_filter.groups()
+                threshold = float(number) * LENGTH_UNITS[unit.lower()]
+                keep &= {
+                    "<": self.lengths < threshold,
+                    "<=": self.lengths <= threshold,
+                    ">": self.lengths > threshold,
+                    ">=": self.lengths >= threshold,
+                }[operator]
+            else:
+                keep &= (
+                    self.locus_ids.str.contains(word, case=False, regex=False).to_numpy()
+                    | self.names.str.contains(word, case=False, regex=False).to_numpy()
+                )
+
+        if sort_column is None:
+            order = np.arange(len(self))
+        else:
+            order = self._order(sort_column)
+            if descending:
+                order = order[::-1]
+        return order[keep[order]]
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from feature_store import compact_feature_columns
+from parsers import locus_table
+from sequence_store import LazySequence
+
+# Bump whenever the layout of the cached tables changes
+CACHE_VERSION = 6
+
+
+def cache_directory(genbank_path):
+    """
+    The cache lives in a sidecar directory next to the genbank file
+    """
+    return f"{genbank_path}.jinx-cache"
+
+
+def file_fingerprint(genbank_path, parser):
+    """
+    What identifies a parse of the file without reading it. The content hash is only
+    stored along with the cache, and checked when the file was touched since.
+    """
+    stat = os.stat(genbank_path)
+
+    return {
+        "version": CACHE_VERSION,
+        # Parsers differ in what they keep (e.g. the sequence), so their tables are not interchangeable
+        "parser": parser,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def file_hash(genbank_path, chunk_size=2**20):
+    content_hash = hashlib.blake2b(digest_size=16)
+    with open(genbank_path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def _cache_matches(genbank_path, saved, fingerprint):
+    """
+    Whether the saved fingerprint of a cache still describes the file. A file with the same
+    size but another modification time (e.g. copied or touched) is hashed to tell.
+    """
+    if any(saved.get(key) != fingerprint[key] for key in ("version", "parser", "size")):
+        return False
+    return saved["mtime_ns"] == fingerprint["mtime_ns"] or saved.get("hash") == file_hash(genbank_path)
+
+
+def _write_locus_table(directory, locus_data):
+    """
+    Scalar columns go to a feather file and the annotations to a JSON file, so that reading
+    a cache never runs code from it. Lazy sequences are rebuilt from their ORIGIN offsets,
+    other sequences are stored as text.
+    """
+    loci = locus_data.reset_index()
+    pd.DataFrame({
+        "locus_id": loci.locus_id,
+        "name": loci.name,
+        "description": loci.description,
+        "sequence": [str(sequence) if sequence is not None and not isinstance(sequence, LazySequence) else None for sequence in loci.sequence],
+        "sequence_length": loci.sequence_length,
+        "origin_start": pd.array(loci.origin_start, dtype="Int64"),
+        "origin_end": pd.array(loci.origin_end, dtype="Int64"),
+    }).to_feather(os.path.join(directory, "loci.feather"))
+
+    with open(os.path.join(directory, "loci.json"), "w") as handle:
+        # Values JSON doesn't know (e.g. Biopython references) are kept as their text
+        json.dump({"dbxrefs": loci.dbxrefs.tolist(), "annotations": loci.annotations.tolist()}, handle, default=str)
+
+
+def _cached_sequence(genbank_path, origin_start, origin_end, length, sequence):
+    if origin_start is not None:
+        return LazySequence(genbank_path, origin_start, origin_end, length)
+    if sequence is not None:
+        from Bio.Seq import Seq
+        return Seq(sequence)
+    return None
+
+
+def _read_locus_table(directory, genbank_path):
+    from pyarrow import feather
+
+    loci = feather.read_feather(os.path.join(directory, "loci.feather"))
+    with open(os.path.join(directory, "loci.json")) as handle:
+        annotations = json.load(handle)
+
+    # Missing offsets become None, so that the columns get the same types as when parsing
+    origin_start = [None if pd.isna(start) else int(start) for start in loci.origin_start]
+    origin_end = [None if pd.isna(end) else int(end) for end in loci.origin_end]
+    sequence_length = loci.sequence_length.tolist()
+
+    # Lazy sequences are read from the genbank file, which may have been moved together with its cache
+    sequences = [
+        _cached_sequence(genbank_path, start, end, length, sequence)
+        for start, end, length, sequence in zip(origin_start, origin_end, sequence_length, loci.sequence)
+    ]
+
+    return locus_table(list(zip(
+        loci.locus_id, loci.name, loci.description, annotations["dbxrefs"], annotations["annotations"],
+        sequences, sequence_length, origin_start, origin_end,
+    )))
+
+
+def load_cache(genbank_path, fingerprint):
+    """
+    Return the cached (feature_data, locus_data) of a genbank file,
+    or None if there is no cache or it doesn't match the fingerprint of the file
+    """
+    directory = cache_directory(genbank_path)
+
+    try:
+        fingerprint_path = os.path.join(directory, "fingerprint.json")
+        with open(fingerprint_path) as handle:
+            saved = json.load(handle)
+        if not _cache_matches(genbank_path, saved, fingerprint):
+            return None
+
+        if saved["mtime_ns"] != fingerprint["mtime_ns"]:
+            # Same content, so the next launch doesn't have to hash it again
+            with open(fingerprint_path, "w") as handle:
+                json.dump({**saved, **fingerprint}, handle)
+
+        from pyarrow import feather
+
+        # Feather files are memory mapped, so numeric columns are read without copying
+        feature_data = feather.read_feather(os.path.join(directory, "features.feather"), memory_map=True)
+        locus_data = _read_locus_table(directory, genbank_path)
+
+    except (FileNotFoundError, ImportError):
+        # No cache yet, or pyarrow is not installed
+        return None
+    except Exception:
+        # Corrupt or unreadable cache, it will be rebuilt
+        shutil.rmtree(directory, ignore_errors=True)
+        return None
+
+    return compact_feature_columns(feature_data), locus_data
+
+
+def save_cache(genbank_path, fingerprint, feature_data, locus_data):
+    """
+    Store the parsed tables next to the genbank file. Failing to do so is not an error,
+    the file will just be parsed again next time.
+    """
+    directory = cache_directory(genbank_path)
+
+    try:
+        content_hash = file_hash(genbank_path)
+        # The file changed while it was parsed, so the tables may not match the hash
+        if file_fingerprint(genbank_path, fingerprint["parser"]) != fingerprint:
+            return
+
+        os.makedirs(directory, exist_ok=True)
+
+        # The fingerprint goes last, so that an interrupted write is never mistaken for a valid cache
+        fingerprint_path = os.path.join(directory, "fingerprint.json")
+        if os.path.exists(fingerprint_path):
+            os.remove(fingerprint_path)
+
+        feature_data.reset_index(drop=True).to_feather(os.path.join(directory, "features.feather"))
+        _write_locus_table(directory, locus_data)
+
+        with open(fingerprint_path, "w") as handle:
+            json.dump({**fingerprint, "hash": content_hash}, handle)
+
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -1,6 +1,12 @@
+import functools
+import io
+
 import pandas as pd
 from Bio import SeqIO
 
+from compressed_input import decompressed
+from feature_store import compact_feature_columns
+
 def format_annotations(annot_value):
      if isinstance(annot_value, str):
           if "\n" in annot_value:
@@ -14,59 +20,106 @@ def format_annotations(annot_value):
           return str(annot_value)
 
 
+def format_record_annotations(annotations):
+    """
+    Markdown with all annotations of a record
+    """
+    return "\n\n".join([f"**{k}**: {format_annotations(v)}" for k, v in annotations.items()])
+
+
+@functools.lru_cache(maxsize=256)
+def format_qualifiers(qualifiers):
+    """
+    Markdown of the "key=value" qualifier lines of a feature.
+    Only the highlighted features are ever shown, so this is done on demand and memoized.
+    """
+    if not qualifiers:
+        return ""
+    return "\n\n".join([f"**{k}**: {v}" for k, _, v in (line.partition("=") for line in qualifiers.split("\n"))])
+
+
+FEATURE_COLUMNS = ["feature_type", "locus", "start", "end", "strand", "locus_tag", "product", "gene", "label", "qualifiers"]
+LOCUS_COLUMNS = ["locus_id", "name", "description", "dbxrefs", "annotations", "sequence", "sequence_length", "origin_start", "origin_end"]
+
+
+def _parse_record(i, record):
+    """
+    Convert a single SeqRecord into a row of the locus table and rows of the feature table
+    """
+    if record.id == "<unknown id>":
+        record.id = f"LOCUS_{i+1:04d}"
+
+    locus_row = [record.id, record.name, record.description, record.dbxrefs, record.annotations, record.seq, len(record.seq), None, None]
+
+    feature_rows = []
+    for feature in record.features:
+        feature_type = feature.type
+        locus = record.id
+        start = feature.location.start
+        end = feature.location.end
+        strand = feature.location.strand
+        locus_tag = feature.qualifiers.get("locus_tag", ["no_tag"])[0]
+        product = feature.qualifiers.get("product", ["no_product"])[0]
+        gene = feature.qualifiers.get("gene", ["no_gene_name"])[0]
+        label = feature.qualifiers.get("gene", ["no_label"])[0]
+
+        qualifiers_list = []
+        for k, value_list in feature.qualifiers.items():
+                for v in value_list:
+                    qualifiers_list.append((k,v))
+
+        qualifiers = "\n".join([f"{k}={v}" for k, v in qualifiers_list])
+
+        feature_rows.append([feature_type, locus, int(start), int(end), strand, locus_tag, product, gene, label, qualifiers])
+
+    return locus_row, feature_rows
+
+
+def determine_labels(feature_data):
+    """
+    Label of every feature: its gene name, or else its product, locus tag or type
+    """
+    current_labels = feature_data.label.copy()
+    current_labels.loc[current_labels == "no_label"] = feature_data.gene.loc[current_labels == "no_label"]
+    current_labels.loc[current_labels == "no_gene_name"] = feature_data["product"].loc[current_labels == "no_gene_name"]
+    current_labels.loc[current_labels == "no_product"] = feature_data.locus_tag.loc[current_labels == "no_product"]
+    current_labels.loc[current_labels == "no_tag"] = feature_data.feature_type.loc[current_labels == "no_tag"].astype(str) + " <no label>"
+    return current_labels
+
+
+def feature_table(feature_rows):
+    genbank_features = pd.DataFrame(feature_rows, columns=FEATURE_COLUMNS)
+    # Labels are resolved once here, so that every table (including the cached ones) has them
+    genbank_features["label"] = determine_labels(genbank_features)
+    return compact_feature_columns(genbank_features).sort_values(["locus", "start"])
+
+
+def locus_table(locus_rows):
+    genbank_loci = pd.DataFrame(locus_rows, columns=LOCUS_COLUMNS)
+    return genbank_loci.set_index("locus_id")
+
+
+def iter_genbank(genbank_path):
+    """
+    Lazily parse a genbank file record by record.
+    Yields (locus_row, feature_rows, bytes_read) for every record.
+    """
+    with open(genbank_path, "rb") as raw, io.TextIOWrapper(decompressed(raw)) as handle:
+        for i, record in enumerate(SeqIO.parse(handle, "genbank")):
+            locus_row, feature_rows = _parse_record(i, record)
+            yield locus_row, feature_rows, raw.tell()
+
+
 def parse_genbank(genbank_path):
     """
     Load a genbank file into a more convenient DataFrame
     """
     rows = []
-    locus_sequences = {}
-
     locus_data_rows = []
 
-    # Iterate through genbank CDS records and convert them to a more convenient data frame
-    with open(genbank_path) as handle:
-        for i, record in enumerate(SeqIO.parse(handle, "genbank")):
-            locus_sequences[record.id] = record.seq
-
-            formatted_annotations = "\n\n".join([f"**{k}**: {format_annotations(v)}" for k, v in record.annotations.items()])
-
-            if record.id == "<unknown id>":
-                record.id = f"LOCUS_{i+1:04d}"
-
-            locus_data_rows.append(
-                [record.id, record.name, record.description, record.dbxrefs, record.annotations, formatted_annotations, record.seq, len(record.seq)]
-            )
-
-            for feature in record.features:
-                feature_type = feature.type
-                locus = record.id
-                start = feature.location.start
-                end = feature.location.end
-                strand = feature.location.strand
-                locus_tag = feature.qualifiers.get("locus_tag", ["no_tag"])[0]
-                product = feature.qualifiers.get("product", ["no_product"])[0]
-                gene = feature.qualifiers.get("gene", ["no_gene_name"])[0]
-                label = feature.qualifiers.get("gene", ["no_label"])[0]
-
-                qualifiers_list = []
-                for k, value_list in feature.qualifiers.items():
-                        for v in value_list:
-                            qualifiers_list.append((k,v))
-
-                qualifiers = "\n".join([f"{k}={v}" for k, v in qualifiers_list])
-                formatted_qualifiers = "\n\n".join([f"**{k}**: {v}" for k, v in qualifiers_list])
-                
-                rows.append([feature_type, locus, int(start), int(end), strand, locus_tag, product, gene, label, qualifiers, formatted_qualifiers])
-    
-    genbank_features = pd.DataFrame(
-        rows, 
-        columns=["feature_type", "locus", "start", "end", "strand", "locus_tag", "product", "gene", "label", "qualifiers", "formatted_qualifiers"]
-    ).sort_values(["locus", "start"])
-
-    genbank_loci = pd.DataFrame(
-        locus_data_rows, 
-        columns=["locus_id", "name", "description", "dbxrefs", "annotations", "formatted_annotations", "sequence", "sequence_length"],
-    )
-    genbank_loci = genbank_loci.set_index("locus_id")
-
-    return genbank_features, genbank_loci
+    # Iterate through genbank records and convert them to a more convenient data frame
+    for locus_row, feature_rows, _ in iter_genbank(genbank_path):
+        locus_data_rows.append(locus_row)
+        rows.extend(feature_rows)
+
+    return feature_table(rows), locus_table(locus_data_rows)
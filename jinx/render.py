@@ -0,0 +1,312 @@
+import argparse
+import io
+import math
+import os
+import re
+import sys
+from collections import namedtuple, OrderedDict
+
+from textual.app import App
+from textual.color import Color
+from textual.css.stylesheet import Stylesheet
+from textual.geometry import Size
+from textual.strip import Strip
+
+from rich.color import ColorSystem
+from rich.console import Console
+from rich.style import Style
+from rich.text import Text
+
+from feature_rendering import FeatureRendering
+from feature_store import LocusFeatureTable
+from feature_viewer import prepare_locus
+from layout import LayoutCache
+from workspace import GENBANK_PARSERS, load_genbank, process_pool
+
+RENDER_FORMATS = {"ansi": "ans", "txt": "txt", "svg": "svg"}
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style", "style.tcss")
+# Same bounds as the zoom of the viewer
+MAX_NT_PER_SQUARE = 2**20
+
+Region = namedtuple("Region", ["locus", "start", "end", "name"])
+
+
+class InvalidRegion(ValueError):
+    """
+    A region which can't be drawn, reported in place of its map
+    """
+
+
+class UnknownLocus(InvalidRegion):
+    pass
+
+
+def read_regions(path):
+    """
+    Read regions from a BED file: locus, 0-based start and end, and optionally a name
+    """
+    regions = []
+    with open(path) as handle:
+        for line_number, line in enumerate(handle, 1):
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            try:
+                locus, start, end = fields[0], int(fields[1]), int(fields[2])
+            except (IndexError, ValueError):
+                raise ValueError(f"{path}:{line_number}: expected a locus, a start and an end separated by tabs") from None
+            if not 0 <= start < end:
+                raise ValueError(f"{path}:{line_number}: the start of a region must be at least 0 and smaller than its end")
+            name = fields[3] if len(fields) > 3 and fields[3] else f"{locus}:{start + 1}-{end}"
+            regions.append(Region(locus, start, end, name))
+    return regions
+
+
+def zoom_level(length, width):
+    """
+    Return the smallest zoom of the viewer (a power of two nucleotides per square) at which a region fits in width squares
+    """
+    nt_per_square = 1 << max(math.ceil(math.log2(max(length, 1) / max(width, 1))), 0)
+    return min(nt_per_square, MAX_NT_PER_SQUARE)
+
+
+def feature_styles(path=STYLESHEET, background="black"):
+    """
+    Read the styles of the feature viewer's component classes from the app's stylesheet,
+    with translucent colors blended over the background
+    """
+    stylesheet = Stylesheet(variables=App().get_css_variables())
+    stylesheet.read(path)
+    stylesheet.parse()
+
+    background = Color.parse(background)
+    styles = {}
+    for rule in stylesheet.rules:
+        for name in rule.selector_names:
+            if name.startswith(".featurevier--") and rule.styles.has_rule("color"):
+                styles[name[1:]] = Style(color=(background + rule.styles.color).rich_color)
+    return styles
+
+
+class RegionRenderer(FeatureRendering):
+    """
+    Draws regions of the loci of a parsed file with the same layout and rendering code as the feature viewer,
+    outside of any app. Layouts are shared by all regions of a locus drawn at the same zoom.
+    """
+
+    def __init__(self, locus_features, locus_data, width=160, label_rows=3, min_height=10, density_threshold=4.0, hidden_types=(), styles=None, layout_cache_size=32, prepared_cache_size=16):
+        self.locus_features = locus_features
+        self.locus_lengths = locus_data.sequence_length.to_dict()
+        # BED files often use the names of the LOCUS lines rather than the accessions
+        self.locus_ids = {name: locus for locus, name in reversed(list(locus_data.name.items()))}
+        self.width = width
+        self.label_rows = label_rows
+        self.min_height = min_height
+        self.density_threshold = density_threshold
+        self.hidden_types = frozenset(hidden_types)
+        self.styles = feature_styles() if styles is None else styles
+        self.layout_cache = LayoutCache(max_entries=layout_cache_size)
+        self.prepared_loci = OrderedDict()
+        self.prepared_cache_size = prepared_cache_size
+        self.size = Size(width, min_height)
+        self.virtual_size = self.size
+
+    def get_component_rich_style(self, name):
+        return self.styles[name]
+
+    def locus_id(self, locus):
+        if locus in self.locus_lengths:
+            return locus
+        if locus in self.locus_ids:
+            return self.locus_ids[locus]
+        raise UnknownLocus(f"No locus named {locus}")
+
+    def _get_prepared(self, locus):
+        prepared = self.prepared_loci.get(locus)
+        if prepared is None:
+            seq_features = self.locus_features.features(locus)
+            if seq_features is None:
+                return None
+            prepared = prepare_locus(seq_features, int(self.locus_lengths[locus]))
+            self.prepared_loci[locus] = prepared
+            if len(self.prepared_loci) > self.prepared_cache_size:
+                self.prepared_loci.popitem(last=False)
+        else:
+            self.prepared_loci.move_to_end(locus)
+        return prepared
+
+    def _get_layout(self, locus, nt_per_square):
+        key = self._layout_key(locus, self.features, nt_per_square)
+        layout = self.layout_cache.get(key)
+        if layout is None:
+            layout = self._new_layout(self.features, nt_per_square)
+            self.layout_cache.put(key, layout)
+        return layout
+
+    def render(self, region):
+        """
+        Return the lines of a region, with blank lines above and below the drawing left out
+        """
+        locus = self.locus_id(region.locus)
+        if region.end > self.locus_lengths[locus]:
+            raise InvalidRegion(f"Region ends after the end of {region.locus} ({self.locus_lengths[locus]} bp)")
+        prepared = self._get_prepared(locus)
+        if prepared is None:
+            return [Strip.blank(self.width)]
+
+        nt_per_square = zoom_level(region.end - region.start, self.width)
+        self.features = prepared.features
+        self.feature_type_classes = [f"type-{feature_type.lower()}" for feature_type in self.features.type_names]
+        self.prepared = prepared
+        self.density_level = self._get_density_level(prepared, nt_per_square)
+
+        leftmost_position_cell = region.start // nt_per_square
+        rightmost_position_cell = leftmost_position_cell + self.width
+
+        if self.density_level is not None:
+            height = max(len(self._shown_density_tracks()), 1)
+        else:
+            self.layout = self._get_layout(locus, nt_per_square)
+            visible_features = self.layout.viewport_index.query(leftmost_position_cell, rightmost_position_cell)
+            if len(visible_features) == 0:
+                return [Strip.blank(self.width)]
+            # Enough rows for label_rows rows of labels on both sides of the features
+            last_visible_row = int(self.layout.vertical_group[visible_features].max())
+            height = max(last_visible_row + 2 * (self.label_rows + 1), self.min_height)
+
+        self.size = self.virtual_size = Size(self.width, height)
+        if self.density_level is None:
+            self._lay_out_visible_features(leftmost_position_cell, rightmost_position_cell)
+
+        strips = [
+            self._render_row(y, leftmost_position_cell, rightmost_position_cell).crop(0, self.width)
+            for y in range(height)
+        ]
+        drawn = [y for y, strip in enumerate(strips) if strip.text.strip()]
+        return strips[drawn[0]:drawn[-1] + 1] if drawn else strips[:1]
+
+
+def format_strips(strips, output_format, title=""):
+    if output_format == "txt":
+        return "".join(strip.text.rstrip() + "\n" for strip in strips)
+
+    if output_format == "ansi":
+        return "".join(
+            "".join(
+                segment.style.render(segment.text, color_system=ColorSystem.TRUECOLOR) if segment.style else segment.text
+                for segment in strip
+            ) + "\n"
+            for strip in strips
+        )
+
+    console = Console(record=True, width=max([strip.cell_length for strip in strips] + [1]), file=io.StringIO())
+    for strip in strips:
+        console.print(Text.assemble(*[(segment.text, segment.style) for segment in strip]), crop=True, soft_wrap=True)
+    return console.export_svg(title=title)
+
+
+# Each worker process keeps a renderer for all the regions it is given
+_renderer = None
+
+
+def _start_worker(feature_data, locus_data, renderer_options):
+    global _renderer
+    locus_features = LocusFeatureTable()
+    if len(feature_data):
+        locus_features.add(feature_data)
+    _renderer = RegionRenderer(locus_features, locus_data, **renderer_options)
+
+
+def _render_chunk(regions, output_format):
+    rendered = []
+    for region in regions:
+        try:
+            rendered.append(format_strips(_renderer.render(region), output_format, title=region.name))
+        except InvalidRegion as error:
+            rendered.append(error)
+    return rendered
+
+
+def render_regions(feature_data, locus_data, regions, output_format="txt", max_workers=None, chunks_per_worker=4, **renderer_options):
+    """
+    Render regions of a parsed genbank file, yielding (region, rendered region) in the order of the regions.
+    Regions of the same locus and zoom are rendered by the same worker, one after the other, so that they share a layout.
+    Regions which can't be drawn (e.g. of an unknown locus) give an InvalidRegion instead of a rendered region.
+    """
+    width = renderer_options.get("width", 160)
+    order = sorted(
+        range(len(regions)),
+        key=lambda i: (regions[i].locus, zoom_level(regions[i].end - regions[i].start, width), regions[i].start)
+    )
+
+    max_workers = max_workers or os.cpu_count()
+    if max_workers < 2 or len(regions) < 2:
+        _start_worker(feature_data, locus_data, renderer_options)
+        rendered = _render_chunk([regions[i] for i in order], output_format)
+    else:
+        chunk_size = math.ceil(len(order) / (max_workers * chunks_per_worker))
+        chunks = [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+        # The file is parsed once here, the workers get the parsed tables
+        executor = process_pool(max_workers, initializer=_start_worker, initargs=(feature_data, locus_data, renderer_options))
+        with executor:
+            futures = [executor.submit(_render_chunk, [regions[i] for i in chunk], output_format) for chunk in chunks]
+            rendered = [result for future in futures for result in future.result()]
+
+    by_region = dict(zip(order, rendered))
+    for i, region in enumerate(regions):
+        yield region, by_region[i]
+
+
+def file_name(region, output_format):
+    return re.sub(r"[^\w.-]+", "_", region.name) + "." + RENDER_FORMATS[output_format]
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog="jinx.py render", description="Render feature maps of regions of a genbank file without starting the viewer")
+    parser.add_argument("path", help="genbank file to render")
+    parser.add_argument("--regions", help="BED file with the regions to render (default: every locus, whole)")
+    parser.add_argument("--width", type=int, default=160, help="width of the maps in characters (default: 160)")
+    parser.add_argument("--label-rows", type=int, default=3, help="rows of labels above and below the features (default: 3)")
+    parser.add_argument("--hide", action="append", default=[], metavar="FEATURE_TYPE", help="feature type not to draw, can be repeated (e.g. --hide gene)")
+    parser.add_argument("--format", choices=RENDER_FORMATS, default="ansi", help="output format (default: ansi)")
+    parser.add_argument("--output", help="directory to write one file per region to, instead of printing the maps")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the parsed file cache")
+    parser.add_argument("--parser", choices=GENBANK_PARSERS, default="biopython", help="genbank parser to use (default: biopython)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes rendering regions (default: one per CPU)")
+    args = parser.parse_args(arguments)
+
+    if args.format == "svg" and args.output is None:
+        parser.error("--format svg needs an --output directory")
+
+    if args.regions is not None:
+        try:
+            regions = read_regions(args.regions)
+        except ValueError as error:
+            parser.error(str(error))
+
+    feature_data, locus_data = load_genbank(args.path, args.parser, use_cache=not args.no_cache)
+    if args.regions is None:
+        regions = [Region(locus, 0, int(length), locus) for locus, length in locus_data.sequence_length.items()]
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+
+    failed = 0
+    for region, rendered in render_regions(
+        feature_data, locus_data, regions, args.format, max_workers=args.workers,
+        width=args.width, label_rows=args.label_rows, hidden_types=args.hide,
+    ):
+        if isinstance(rendered, InvalidRegion):
+            print(f"{region.name}: {rendered}", file=sys.stderr)
+            failed += 1
+        elif args.output is not None:
+            with open(os.path.join(args.output, file_name(region, args.format)), "w") as handle:
+                handle.write(rendered)
+        else:
+            sys.stdout.write(f"{region.name}\n{rendered}\n")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
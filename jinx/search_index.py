@@ -0,0 +1,230 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+# Qualifiers whose values name features, and which features can be looked up by
+KEY_QUALIFIERS = ("locus_tag", "gene", "protein_id", "db_xref")
+
+
+def _trigram_codes(data):
+    """
+    Encode every three consecutive bytes of a uint8 array as a single integer
+    """
+    data = data.astype(np.uint32)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+
+def _sorted_unique(values):
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+class QualifierIndex:
+    """
+    Inverted index of byte trigrams over the qualifiers of all features, across all loci.
+
+    Queries are literal substrings of the "key=value" qualifier lines. A query of the
+    form "key:text" only matches "text" inside the values of qualifier "key".
+    Candidate features are the intersection of the posting lists of the query trigrams,
+    and are then verified against the qualifier strings.
+    """
+
+    def __init__(self, feature_data, chunk_size=20000):
+        self.feature_data = feature_data
+        self.qualifiers = feature_data.qualifiers.tolist()
+        self.keys = set()
+        # Locus of every feature, as a code into the loci in order of appearance
+        self.locus_codes, self.loci = pd.factorize(feature_data.locus)
+
+        trigram_keys = []
+        for first in range(0, len(self.qualifiers), chunk_size):
+            trigram_keys.append(self._index_chunk(first, self.qualifiers[first:first+chunk_size]))
+
+        trigram_keys = np.sort(np.concatenate(trigram_keys)) if trigram_keys else np.empty(0, dtype=np.int64)
+
+        # Posting lists: features containing trigram self.trigrams[i] are
+        # self.postings[self.posting_offsets[i]:self.posting_offsets[i+1]]
+        self.postings = (trigram_keys & 0xFFFFFFFF).astype(np.int32)
+        all_trigrams = (trigram_keys >> 32).astype(np.uint32)
+        self.trigrams = _sorted_unique(all_trigrams)
+        self.posting_offsets = np.searchsorted(all_trigrams, np.append(self.trigrams, np.iinfo(np.uint32).max))
+        self.posting_offsets[-1] = len(all_trigrams)
+
+    def _index_chunk(self, first, qualifiers):
+        for qualifier_lines in qualifiers:
+            self.keys.update(line.split("=", 1)[0] for line in qualifier_lines.split("\n"))
+
+        encoded = [q.encode() for q in qualifiers]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        feature = np.repeat(np.arange(first, first + len(encoded), dtype=np.int64), lengths)
+
+        if len(data) < 3:
+            return np.empty(0, dtype=np.int64)
+
+        # Drop trigrams spanning two features
+        within_feature = feature[:-2] == feature[2:]
+        codes = _trigram_codes(data)[within_feature].astype(np.int64)
+
+        return _sorted_unique((codes << 32) | feature[:-2][within_feature])
+
+    def __len__(self):
+        return len(self.qualifiers)
+
+    def _postings(self, trigram):
+        i = np.searchsorted(self.trigrams, trigram)
+        if i == len(self.trigrams) or self.trigrams[i] != trigram:
+            return self.postings[:0]
+        return self.postings[self.posting_offsets[i]:self.posting_offsets[i+1]]
+
+    def _candidates(self, text):
+        encoded = np.frombuffer(text.encode(), dtype=np.uint8)
+        if len(encoded) < 3:
+            # Too short to be indexed, every feature is a candidate
+            return None
+
+        # Intersect the shortest posting lists first
+        posting_lists = sorted((self._postings(t) for t in set(_trigram_codes(encoded).tolist())), key=len)
+        candidates = posting_lists[0]
+        for postings in posting_lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, postings, assume_unique=True)
+        return candidates
+
+    def parse_query(self, query):
+        """
+        Split a query into (key, text); key is None unless the query starts with a known qualifier key and a colon
+        """
+        key, separator, text = query.partition(":")
+        if separator and key in self.keys:
+            return key, text
+        return None, query
+
+    def _matches(self, candidates, key, text):
+        if key is None:
+            return [i for i in candidates if text in self.qualifiers[i]]
+
+        prefix = key + "="
+        return [
+            i for i in candidates
+            if any(
+                line.startswith(prefix) and text in line[len(prefix):]
+                for line in self.qualifiers[i].split("\n")
+            )
+        ]
+
+    def search_positions(self, query):
+        """
+        Return the positions (within the indexed feature table) of features matching the query
+        """
+        key, text = self.parse_query(query)
+
+        candidates = self._candidates(text)
+        if candidates is None:
+            candidates = range(len(self.qualifiers))
+        else:
+            candidates = candidates.tolist()
+
+        return np.array(self._matches(candidates, key, text), dtype=np.int64)
+
+    def search(self, query):
+        """
+        Return the features matching the query, in the order of the indexed feature table
+        """
+        return self.feature_data.iloc[self.search_positions(query)]
+
+    def iter_search_by_locus(self, query, loci=None, batch_size=500):
+        """
+        Search once and yield the matches locus by locus, as (locus, DataFrame) pairs of at most batch_size features.
+        Loci are in the order of `loci` if given, otherwise in the order of the indexed feature table,
+        and loci without matches are skipped.
+        """
+        if loci is None:
+            loci = self.loci
+        # Rank of every indexed locus in the requested order, -1 for the loci which were not requested
+        loci = list(loci)
+        codes = self.loci.get_indexer(loci)
+        rank = np.full(len(self.loci), -1, dtype=np.int64)
+        rank[codes[codes >= 0]] = np.flatnonzero(codes >= 0)
+
+        matches = self.search_positions(query)
+        match_rank = rank[self.locus_codes[matches]]
+        matches, match_rank = matches[match_rank >= 0], match_rank[match_rank >= 0]
+
+        # Matches are in table order, a stable sort keeps it within each locus
+        order = np.argsort(match_rank, kind="stable")
+        matches, match_rank = matches[order], match_rank[order]
+        found = self.feature_data.iloc[matches]
+
+        boundaries = np.flatnonzero(np.diff(match_rank)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(matches) else boundaries
+        stops = np.concatenate((boundaries, [len(matches)])) if len(matches) else boundaries
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            locus = loci[match_rank[start]]
+            for first in range(start, stop, batch_size):
+                yield locus, found.iloc[first:min(first + batch_size, stop)]
+
+    def search_by_locus(self, query, loci=None):
+        """
+        Return a dict mapping loci to DataFrames of their features matching the query.
+        Loci without matches are left out; loci are ordered as in `loci` if given.
+        """
+        # A single batch per locus
+        return dict(self.iter_search_by_locus(query, loci, batch_size=max(len(self), 1)))
+
+
+class KeyIndex:
+    """
+    Hash index from the names of features (the values of KEY_QUALIFIERS) to their positions
+    in the indexed feature table, across all loci. Names are matched regardless of case,
+    and a sorted list of all names allows completing a prefix.
+    """
+
+    def __init__(self, feature_data, keys=KEY_QUALIFIERS):
+        self.feature_data = feature_data
+        prefixes = tuple(f"{key}=" for key in keys)
+
+        # Case folded name -> (name as written, positions of the features)
+        self.names = {}
+        for position, qualifier_lines in enumerate(feature_data.qualifiers.tolist()):
+            for line in qualifier_lines.split("\n"):
+                if not line.startswith(prefixes):
+                    continue
+
+                name = line.split("=", 1)[1]
+                _, positions = self.names.setdefault(name.casefold(), (name, []))
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+        self.sorted_names = sorted(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name.casefold() in self.names
+
+    def lookup(self, name):
+        """
+        Return the features with the given name, in the order of the indexed feature table
+        """
+        _, positions = self.names.get(name.casefold(), (None, []))
+        return self.feature_data.iloc[positions]
+
+    def complete(self, prefix, limit=5):
+        """
+        Return up to limit names (as written) starting with the prefix, in sorted order
+        """
+        prefix = prefix.casefold()
+        first = bisect.bisect_left(self.sorted_names, prefix)
+
+        completions = []
+        for name in self.sorted_names[first:first + limit]:
+            if not name.startswith(prefix):
+                break
+            completions.append(self.names[name][0])
+        return completions
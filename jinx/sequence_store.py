@@ -0,0 +1,131 @@
+import functools
+import mmap
+import re
+
+from compressed_input import CompressedBuffer, compression
+
+# Line layout of the ORIGIN block: the position, then groups of 10 residues separated by spaces
+RESIDUES_PER_LINE = 60
+RESIDUES_PER_GROUP = 10
+# Longer than any line of a block with the standard layout
+MAX_LINE_LENGTH = 128
+LINE_PREFIX = re.compile(rb" *\d+ ")
+NOT_RESIDUES = b" \t\r\n0123456789/"
+
+
+@functools.lru_cache(maxsize=16)
+def _open_buffer(path):
+    """
+    Memory map a file read-only, or open it for random access if it is compressed.
+    Buffers are shared by all sequences of the same file.
+    """
+    if compression(path) is not None:
+        return CompressedBuffer(path)
+
+    with open(path, "rb") as handle:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class LazySequence:
+    """
+    Sequence of a record which is read from the ORIGIN block of the genbank file on demand.
+    Only the residues of the requested window are read, so nothing is held in memory.
+    Slicing returns upper case strings, like str() of a Biopython Seq.
+    """
+
+    def __init__(self, path, origin_start, origin_end, length):
+        self.path = path
+        self.origin_start = origin_start
+        self.origin_end = origin_end
+        self.length = length
+        self._line_layout = None
+        # Residues of blocks which don't follow the standard layout, read all at once
+        self._residues = None
+
+    def __getstate__(self):
+        # Only the location of the sequence is pickled, never the residues
+        return {"path": self.path, "origin_start": self.origin_start, "origin_end": self.origin_end, "length": self.length}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return f"LazySequence({self.path!r}, {self.origin_start}, {self.origin_end}, length={self.length})"
+
+    def __str__(self):
+        return self.window(0, self.length)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            positions = range(*key.indices(self.length))
+            if positions.step == 1:
+                return self.window(positions.start, positions.stop)
+            if not positions:
+                return ""
+
+            # Read the covered window once and step through it
+            first = min(positions[0], positions[-1])
+            stop = positions.stop - first
+            return self.window(first, max(positions[0], positions[-1]) + 1)[positions.start - first:stop if stop >= 0 else None:positions.step]
+
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError("sequence index out of range")
+        return self.window(key, key + 1)
+
+    def _layout(self, buffer):
+        """
+        Return (line prefix width, line length) if the block has the standard layout, otherwise None
+        """
+        first_line = buffer[self.origin_start:min(self.origin_start + MAX_LINE_LENGTH, self.origin_end)]
+        prefix = LINE_PREFIX.match(first_line)
+        if prefix is None:
+            return None
+
+        first_line_end = first_line.find(b"\n")
+        newline = 2 if first_line_end > 0 and first_line[first_line_end - 1:first_line_end] == b"\r" else 1
+        prefix = prefix.end()
+
+        line_length = prefix + RESIDUES_PER_LINE + RESIDUES_PER_LINE // RESIDUES_PER_GROUP - 1 + newline
+        full_lines, remainder = divmod(self.length, RESIDUES_PER_LINE)
+        expected_size = full_lines * line_length
+        if remainder:
+            expected_size += prefix + remainder + (remainder - 1) // RESIDUES_PER_GROUP + newline
+
+        if expected_size != self.origin_end - self.origin_start:
+            return None
+        return prefix, line_length
+
+    def _offset(self, position):
+        prefix, line_length = self._line_layout
+        line, column = divmod(position, RESIDUES_PER_LINE)
+        return self.origin_start + line * line_length + prefix + column + column // RESIDUES_PER_GROUP
+
+    def window(self, start, end):
+        """
+        Return the residues in [start, end) as an upper case string
+        """
+        start, end = max(start, 0), min(end, self.length)
+        if start >= end:
+            return ""
+
+        if self._residues is not None:
+            return self._residues[start:end]
+
+        buffer = _open_buffer(self.path)
+        if self._line_layout is None:
+            # Compressed files other than BGZF are only read forward, so each window would inflate the file from its start
+            sequential = isinstance(buffer, CompressedBuffer) and buffer.index is None
+            self._line_layout = None if sequential else self._layout(buffer)
+
+            if self._line_layout is None:
+                # Non-standard layout or sequential file, fall back to reading the whole block
+                self._residues = buffer[self.origin_start:self.origin_end].translate(None, NOT_RESIDUES).decode().upper()
+                return self._residues[start:end]
+
+        residues = buffer[self._offset(start):self._offset(end - 1) + 1]
+        return residues.translate(None, NOT_RESIDUES).decode().upper()
@@ -0,0 +1,152 @@
+import contextlib
+import glob
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from compressed_input import COMPRESSED_EXTENSIONS, compression
+from parsers import iter_genbank, feature_table, locus_table
+from fast_parser import iter_genbank_fast, parse_records, record_offsets
+from parse_cache import file_fingerprint, load_cache, save_cache
+
+GENBANK_EXTENSIONS = (".gb", ".gbk", ".gbff", ".genbank")
+
+# Smaller files are parsed faster than the worker processes start up
+PARALLEL_PARSE_SIZE = 16 * 2**20
+
+
+def process_pool(max_workers=None, initializer=None, initargs=()):
+    """
+    Pool of worker processes, which are spawned rather than forked since the app is running other threads
+    """
+    # Textual replaces stderr with an object without a file descriptor,
+    # which would be handed on to the resource tracker started along with the pool
+    with contextlib.redirect_stderr(sys.__stderr__):
+        return ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer, initargs=initargs
+        )
+
+
+def iter_genbank_parallel(genbank_path, max_workers=None, chunks_per_worker=4):
+    """
+    Parse a genbank file like iter_genbank_fast, with the file split into chunks of records which are parsed in worker processes.
+    Records are still yielded in the order of the file, and numbered as if they were parsed sequentially.
+    """
+    max_workers = max_workers or os.cpu_count()
+    # Compressed files can only be entered in the middle if they are BGZF files
+    splittable = compression(genbank_path) in (None, "bgzf")
+
+    if max_workers < 2 or not splittable or os.path.getsize(genbank_path) < PARALLEL_PARSE_SIZE:
+        yield from iter_genbank_fast(genbank_path)
+        return
+
+    offsets = record_offsets(genbank_path)
+    if len(offsets) < 2:
+        yield from iter_genbank_fast(genbank_path)
+        return
+
+    # Several chunks of roughly the same size per worker, so that they are evenly busy
+    chunk_size = offsets[-1] / (max_workers * chunks_per_worker)
+    chunks, first = [], 0
+    for i in range(1, len(offsets) + 1):
+        if i == len(offsets):
+            chunks.append((offsets[first], None, first))
+        elif offsets[i] - offsets[first] >= chunk_size:
+            chunks.append((offsets[first], offsets[i], first))
+            first = i
+
+    with process_pool(max_workers) as executor:
+        futures = [executor.submit(parse_records, genbank_path, start, end, first_index) for start, end, first_index in chunks]
+        for future in futures:
+            yield from future.result()
+
+
+# Biopython is slower, but parses everything including the sequences and is kept as the reference
+GENBANK_PARSERS = {
+    "fast": iter_genbank_fast,
+    "parallel": iter_genbank_parallel,
+    "biopython": iter_genbank,
+}
+
+
+def _is_genbank(name):
+    name = name.lower()
+    for extension in COMPRESSED_EXTENSIONS:
+        name = name.removesuffix(extension)
+    return name.endswith(GENBANK_EXTENSIONS)
+
+
+def expand_paths(arguments):
+    """
+    Turn command line arguments into a list of genbank files.
+    Directories are replaced by the (possibly compressed) genbank files they contain, glob patterns by their matches.
+    """
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            paths.extend(sorted(
+                os.path.join(argument, name) for name in os.listdir(argument)
+                if _is_genbank(name)
+            ))
+        elif glob.has_magic(argument):
+            paths.extend(sorted(glob.glob(argument)))
+        else:
+            paths.append(argument)
+    return paths
+
+
+def file_labels(paths):
+    """
+    Short names telling the files apart: their file names, or their paths if file names repeat
+    """
+    names = [os.path.basename(path) for path in paths]
+    if len(set(names)) == len(names):
+        return dict(zip(paths, names))
+
+    common = os.path.commonpath([os.path.abspath(path) for path in paths])
+    return {path: os.path.relpath(os.path.abspath(path), common) for path in paths}
+
+
+def load_genbank(path, parser="biopython", use_cache=True):
+    """
+    Parse a whole genbank file into (feature_data, locus_data), going through the cache if enabled.
+    Runs in worker processes, so it only gets and returns picklable data.
+    """
+    if use_cache:
+        fingerprint = file_fingerprint(path, parser)
+        cached = load_cache(path, fingerprint)
+        if cached is not None:
+            return cached
+
+    feature_rows, locus_rows = [], []
+    for locus_row, record_feature_rows, _ in GENBANK_PARSERS[parser](path):
+        locus_rows.append(locus_row)
+        feature_rows.extend(record_feature_rows)
+
+    feature_data, locus_data = feature_table(feature_rows), locus_table(locus_rows)
+
+    if use_cache:
+        save_cache(path, fingerprint, feature_data, locus_data)
+
+    return feature_data, locus_data
+
+
+def workspace_tables(path, label, feature_data, locus_data, first_feature_id):
+    """
+    Make the tables of one file part of a workspace of several files:
+    loci are keyed by "label:locus" and features are numbered from first_feature_id
+    """
+    def workspace_locus(locus):
+        return f"{label}:{locus}"
+
+    locus_data = locus_data.rename(index=workspace_locus)
+    locus_data.index.name = "locus_id"
+    locus_data["file"] = path
+
+    feature_data = feature_data.copy()
+    feature_data["locus"] = feature_data.locus.astype("category").cat.rename_categories(workspace_locus)
+    feature_data.index = feature_data.index + first_feature_id
+
+    return feature_data, locus_data
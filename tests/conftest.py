@@ -0,0 +1,69 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+# The modules of jinx import each other as siblings, like when running jinx/jinx.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jinx"))
+
+FEATURE_TABLE = """\
+     source          1..300
+                     /organism="Testus syntheticus"
+                     /mol_type="genomic DNA"
+     gene            <1..>120
+                     /gene="abcA"
+                     /locus_tag="T_0001"
+     CDS             join(10..30,40..90)
+                     /gene="abcA"
+                     /note="a note long enough to be wrapped over more than one
+                     line of the feature table"
+                     /translation="MKLVSAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA
+                     AAAAAAAAA"
+     CDS             complement(join(100..150,
+                     160..200))
+                     /locus_tag="T_0002"
+                     /product="protein with ""quoted"" words"
+     misc_feature    order(5..8,20..25,complement(50..60))
+                     /note="mixed strands"
+     repeat_region   one-of(200,203)..one-of(250,255)
+                     /rpt_type=direct
+     misc_feature    complement(<210..>290)
+                     /note="ends with an escaped ""quote""
+                     at the end of a line"
+                     /note="second note"
+     misc_feature    295^296
+                     /pseudo
+     gene            join(complement(260..280),complement(230..240))
+                     /gene="revB"
+"""
+
+
+def genbank_record(feature_table=FEATURE_TABLE, length=300):
+    sequence = "acgt" * (length // 4)
+    origin = "".join(
+        f"{i + 1:>9} " + " ".join(textwrap.wrap(sequence[i:i + 60], 10)) + "\n"
+        for i in range(0, length, 60)
+    )
+    return (
+        f"LOCUS       TEST0001                 {length} bp    DNA     linear   UNK 01-JAN-1980\n"
+        "DEFINITION  Test record.\n"
+        "ACCESSION   TEST0001\n"
+        "VERSION     TEST0001.1\n"
+        "KEYWORDS    .\n"
+        "SOURCE      .\n"
+        "  ORGANISM  Testus syntheticus\n"
+        "            Bacteria.\n"
+        "FEATURES             Location/Qualifiers\n"
+        f"{feature_table}"
+        "ORIGIN\n"
+        f"{origin}"
+        "//\n"
+    )
+
+
+@pytest.fixture
+def genbank_path(tmp_path):
+    path = tmp_path / "test.gbk"
+    path.write_text(genbank_record())
+    return str(path)
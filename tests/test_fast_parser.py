@@ -0,0 +1,32 @@
+from Bio import SeqIO
+
+from fast_parser import iter_genbank_fast, parse_feature
+
+
+def test_features_match_biopython(genbank_path):
+    (locus_row, feature_rows, _), = iter_genbank_fast(genbank_path)
+    record = SeqIO.read(genbank_path, "genbank")
+
+    assert locus_row[0] == record.id
+    assert len(feature_rows) == len(record.features)
+    for row, feature in zip(feature_rows, record.features):
+        feature_type, locus, start, end, strand, *_, qualifiers = row
+        assert (feature_type, start, end, strand) == (
+            feature.type, int(feature.location.start), int(feature.location.end), feature.location.strand
+        )
+        assert qualifiers == "\n".join(f"{key}={value}" for key, values in feature.qualifiers.items() for value in values)
+
+
+def test_escaped_quote_at_the_end_of_a_line():
+    _, qualifiers = parse_feature([
+        "1..10",
+        '/note="ends with an ""escaped""',
+        'quote"',
+        '/product="x"',
+    ])
+    assert qualifiers == {"note": ['ends with an "escaped" quote'], "product": ["x"]}
+
+
+def test_unterminated_quote():
+    _, qualifiers = parse_feature(["1..10", '/product="kinase', "/note=x"])
+    assert qualifiers == {"product": ["kinase /note=x"]}
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from feature_store import FeatureStore
+
+
+@pytest.fixture
+def features():
+    return FeatureStore.from_frame(pd.DataFrame({
+        "start": [0, 5, 10, 10, 20, 30],
+        "end": [100, 15, 12, 40, 25, 60],
+        "strand": [1, -1, 1, None, 1, -1],
+        "feature_type": ["source", "gene", "CDS", "gene", "CDS", "tRNA"],
+        "label": ["source", "a", "a", "b", "c", "d"],
+    }))
+
+
+def test_type_rows(features):
+    rows = {name: features.type_rows[code].tolist() for code, name in enumerate(features.type_names)}
+    assert rows == {"CDS": [2, 4], "gene": [1, 3], "source": [0], "tRNA": [5]}
+
+
+def test_type_codes(features):
+    codes = features.type_codes({"gene", "tRNA", "rRNA"})
+    assert sorted(features.type_names[code] for code in codes) == ["gene", "tRNA"]
+    assert features.type_codes(set()) == []
+
+
+def test_shown_rows(features):
+    assert features.shown_rows([]) is None
+    assert features.shown_rows(features.type_codes({"gene"})).tolist() == [0, 2, 4, 5]
+    assert features.shown_rows(features.type_codes({"gene", "CDS"})).tolist() == [0, 5]
+    assert features.shown_rows(features.type_codes(set(features.type_names))).tolist() == []
+
+
+def test_store_without_features():
+    features = FeatureStore.from_frame(pd.DataFrame({"start": [], "end": [], "strand": [], "feature_type": [], "label": []}))
+    assert len(features) == 0
+    assert features.shown_rows(features.type_codes({"gene"})) is None
+    assert features.nbytes >= 0
@@ -0,0 +1,115 @@
+import numpy as np
+from rich.style import Style
+from textual.geometry import Size
+
+from feature_rendering import FeatureRendering
+from feature_store import FeatureStore, StringPool
+from labels import assign_vertical_label_groups, place_labels
+from layout import FeatureLayout
+
+
+def placement(screen_start, screen_end, vertical_group, label_width, left=0, right=100, space=5):
+    return place_labels(
+        np.array(screen_start), np.array(screen_end), np.array(vertical_group), np.array(label_width),
+        left, right, space
+    )
+
+
+def test_label_goes_above_a_free_feature():
+    above, below = placement([10], [20], [0], [4])
+    assert above.feature.tolist() == [0]
+    assert above.x_coord.tolist() == [10]
+    assert len(below.feature) == 0
+
+
+def test_label_goes_below_when_covered_above():
+    # The second feature is covered by the first one above its start, but free below
+    above, below = placement([0, 0], [10, 20], [0, 1], [4, 4])
+    assert above.feature.tolist() == [0]
+    assert below.feature.tolist() == [1]
+    assert below.x_coord.tolist() == [0]
+
+
+def test_label_moves_right_to_the_first_free_position():
+    # Covered above by the first feature and below by the third, but free above from x=10 on
+    above, below = placement([0, 0, 0], [10, 30, 30], [0, 1, 2], [4, 4, 4])
+    assert 1 in above.feature.tolist()
+    assert above.x_coord[above.feature.tolist().index(1)] == 10
+
+
+def test_no_label_when_covered_on_both_sides():
+    above, below = placement([0, 0, 0], [10, 10, 10], [0, 1, 2], [4, 4, 4])
+    assert 1 not in above.feature.tolist() + below.feature.tolist()
+
+
+def test_label_starts_at_the_left_screen_edge():
+    above, _ = placement([0], [50], [0], [4], left=20, right=40)
+    assert above.x_coord.tolist() == [20]
+
+
+def test_feature_off_screen_has_no_label():
+    above, below = placement([0], [10], [0], [4], left=20, right=40)
+    assert len(above.feature) == 0 and len(below.feature) == 0
+
+
+def test_overlapping_labels_are_stacked_or_dropped():
+    assert assign_vertical_label_groups([0, 3, 20], [5, 5, 5], 2).tolist() == [0, 1, 0]
+    # Without a second row, the overlapping label is dropped
+    assert assign_vertical_label_groups([0, 3, 20], [5, 5, 5], 1).tolist() == [0, -1, 0]
+
+
+class LabelRenderer(FeatureRendering):
+    """
+    Draws features and their labels at one nucleotide per square, without a widget
+    """
+
+    def __init__(self, start, end, labels, width, height=12, left=0):
+        start, end = np.array(start), np.array(end)
+        self.features = FeatureStore(
+            start, end, np.ones(len(start), dtype=np.int8), np.zeros(len(start), dtype=np.int8), ["CDS"], StringPool(labels)
+        )
+        self.feature_type_classes = ["type-cds"]
+        self.layout = FeatureLayout(start, end, 1)
+        self.density_level = None
+        self.size = self.virtual_size = Size(width, height)
+        self.left = left
+
+    def get_component_rich_style(self, name):
+        return Style()
+
+    def lines(self):
+        right = self.left + self.size.width
+        self._lay_out_visible_features(self.left, right)
+        return [self._render_row(y, self.left, right).text.rstrip() for y in range(self.size.height)]
+
+
+def test_stems_connect_stacked_labels_to_their_features():
+    lines = LabelRenderer([0, 2, 4], [10, 12, 14], ["alpha", "beta", "gamma"], 30).lines()
+    # alpha above the features, beta and gamma below, beta further out with a stem through gamma's row
+    assert lines[3:] == [
+        "alpha",
+        "│",
+        "╺━━━━━━━━▶",
+        "  ╺━━━━━━━━▶",
+        "    ╺━━━━━━━━▶",
+        "  │ │",
+        "  │ gamma",
+        "  beta",
+        "",
+    ]
+
+
+def test_label_is_truncated_at_the_right_edge():
+    lines = LabelRenderer([0], [30], ["a_very_long_label"], 10).lines()
+    assert "a_very_lo…" in lines
+
+
+def test_label_fitting_exactly_is_not_truncated():
+    lines = LabelRenderer([0], [10], ["exact"], 5).lines()
+    assert "exact" in lines
+
+
+def test_label_of_feature_overflowing_left_starts_at_the_edge():
+    lines = LabelRenderer([0], [40], ["left"], 20, left=10).lines()
+    assert "left" in lines
+    assert "┅━━━━━━━━━━━━━━━━━▶┅" in lines
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from layout import FeatureLayout, IntervalQuery
+
+
+def brute_force_query(start, end, left, right):
+    return np.flatnonzero((start < right) & (end > left))
+
+
+@pytest.fixture
+def intervals():
+    rng = np.random.default_rng(0)
+    start = np.sort(rng.integers(0, 100_000, 2000))
+    end = start + rng.integers(0, 500, 2000)
+    # A source feature spanning the whole locus, like in every genbank record
+    start[0], end[0] = 0, 100_000
+    # Unsorted, empty and very long intervals at the end
+    start = np.concatenate([start, [50, 70_000, 10]])
+    end = np.concatenate([end, [50, 70_001, 90_000]])
+    return start, end
+
+
+def test_interval_query_matches_brute_force(intervals):
+    start, end = intervals
+    query = IntervalQuery(start, end)
+
+    rng = np.random.default_rng(1)
+    for left in rng.integers(-100, 100_100, 500).tolist():
+        right = left + int(rng.integers(0, 5000))
+        assert query.query(left, right).tolist() == brute_force_query(start, end, left, right).tolist()
+
+
+def test_interval_query_positions(intervals):
+    start, end = intervals
+    rows = np.arange(0, len(start), 3)
+    query = IntervalQuery(start[rows], end[rows], positions=rows)
+
+    expected = rows[brute_force_query(start[rows], end[rows], 40_000, 41_000)]
+    assert query.query(40_000, 41_000).tolist() == expected.tolist()
+
+
+def test_interval_query_empty():
+    query = IntervalQuery(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    assert len(query) == 0
+    assert len(query.query(0, 10)) == 0
+
+
+@pytest.fixture
+def features(intervals):
+    start, end = intervals
+    rng = np.random.default_rng(2)
+    # Every third feature of a hidden type
+    return start, end, np.flatnonzero(rng.integers(0, 3, len(start)) != 0)
+
+
+@pytest.mark.parametrize("nt_per_square", [1, 16, 256])
+def test_layout_of_shown_rows(features, nt_per_square):
+    start, end, rows = features
+    layout = FeatureLayout(start, end, nt_per_square, rows=rows)
+    # The same features laid out on their own
+    subset = FeatureLayout(start[rows], end[rows], nt_per_square)
+
+    hidden = np.setdiff1d(np.arange(len(start)), rows)
+    assert (layout.vertical_group[hidden] == -1).all()
+    assert layout.vertical_group[rows].tolist() == subset.vertical_group.tolist()
+    assert layout.row_count == subset.row_count
+
+    left, right = 30_000 // nt_per_square, 35_000 // nt_per_square
+    for row in range(layout.row_count):
+        assert layout.row_features(row, left, right).tolist() == rows[subset.row_features(row, left, right)].tolist()
+    assert layout.viewport_index.query(left, right).tolist() == rows[subset.viewport_index.query(left, right)].tolist()
+
+
+def test_layout_with_every_row_hidden(features):
+    start, end, _ = features
+    layout = FeatureLayout(start, end, 16, rows=np.empty(0, dtype=np.int64))
+
+    assert (layout.vertical_group == -1).all()
+    assert layout.row_count == 0
+    assert len(layout.row_features(0, 0, 10_000)) == 0
+    assert len(layout.viewport_index.query(0, 10_000)) == 0
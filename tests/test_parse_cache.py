@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import parse_cache
+from parse_cache import file_fingerprint, load_cache
+from workspace import load_genbank
+
+
+@pytest.fixture
+def cached_path(genbank_path):
+    load_genbank(genbank_path, "fast")
+    return genbank_path
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """
+    Paths whose content was hashed
+    """
+    paths = []
+    file_hash = parse_cache.file_hash
+
+    def counting_file_hash(genbank_path, *args, **kwargs):
+        paths.append(genbank_path)
+        return file_hash(genbank_path, *args, **kwargs)
+
+    monkeypatch.setattr(parse_cache, "file_hash", counting_file_hash)
+    return paths
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_unchanged_file_is_not_hashed(cached_path, hashed):
+    assert load_cache(cached_path, file_fingerprint(cached_path, "fast")) is not None
+    assert hashed == []
+
+
+def test_other_parser_misses(cached_path, hashed):
+    assert load_cache(cached_path, file_fingerprint(cached_path, "biopython")) is None
+    assert hashed == []
+
+
+def test_touched_file_is_hashed_once(cached_path, hashed):
+    touch(cached_path)
+
+    assert load_cache(cached_path, file_fingerprint(cached_path, "fast")) is not None
+    assert load_cache(cached_path, file_fingerprint(cached_path, "fast")) is not None
+    assert hashed == [cached_path]
+
+
+def test_changed_content_misses(cached_path, hashed):
+    with open(cached_path, "r+b") as handle:
+        content = handle.read()
+        handle.seek(0)
+        handle.write(content.replace(b"abcA", b"abcZ"))
+    touch(cached_path)
+
+    assert load_cache(cached_path, file_fingerprint(cached_path, "fast")) is None
+    assert hashed == [cached_path]
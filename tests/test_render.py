@@ -0,0 +1,73 @@
+import pytest
+
+from render import InvalidRegion, Region, UnknownLocus, read_regions, render_regions, zoom_level
+from workspace import load_genbank
+
+
+@pytest.fixture
+def tables(genbank_path):
+    return load_genbank(genbank_path, "fast", use_cache=False)
+
+
+def test_read_regions(tmp_path):
+    path = tmp_path / "regions.bed"
+    path.write_text("track name=test\n# comment\nTEST0001\t0\t100\tfirst\n\nTEST0001\t150\t300\n")
+
+    assert read_regions(path) == [
+        Region("TEST0001", 0, 100, "first"),
+        Region("TEST0001", 150, 300, "TEST0001:151-300"),
+    ]
+
+
+@pytest.mark.parametrize("line", ["TEST0001\t100\t100", "TEST0001\t200\t100", "TEST0001\t-5\t100", "TEST0001\t0", "TEST0001 0 100"])
+def test_read_invalid_regions(tmp_path, line):
+    path = tmp_path / "regions.bed"
+    path.write_text(line + "\n")
+
+    with pytest.raises(ValueError, match=":1:"):
+        read_regions(path)
+
+
+def test_zoom_level():
+    assert zoom_level(100, 160) == 1
+    assert zoom_level(161, 160) == 2
+    assert zoom_level(10_000, 160) == 64
+    assert zoom_level(10**9, 160) == 2**20
+
+
+def test_render_regions(tables):
+    regions = [
+        # By the name of the LOCUS line, and by the accession and version
+        Region("TEST0001", 0, 300, "whole"),
+        Region("TEST0001.1", 0, 150, "by_id"),
+        Region("missing", 0, 100, "missing"),
+        Region("TEST0001", 200, 400, "past_end"),
+    ]
+    rendered = dict((region.name, result) for region, result in render_regions(*tables, regions, "txt", max_workers=1, width=80))
+
+    assert "abcA" in rendered["whole"]
+    assert "revB" in rendered["whole"]
+    assert "abcA" in rendered["by_id"]
+    assert isinstance(rendered["missing"], UnknownLocus)
+    assert isinstance(rendered["past_end"], InvalidRegion)
+
+
+def test_hidden_types_are_not_drawn(tables):
+    region = Region("TEST0001", 0, 300, "whole")
+    (_, shown), = render_regions(*tables, [region], "txt", max_workers=1, width=80)
+    (_, hidden), = render_regions(*tables, [region], "txt", max_workers=1, width=80, hidden_types=["gene"])
+
+    assert "revB" in shown
+    assert "revB" not in hidden
+
+
+def test_workers_render_like_a_single_process(tables):
+    regions = [Region("TEST0001", start, start + 100, f"region_{start}") for start in range(0, 200, 20)]
+    regions.append(Region("missing", 0, 100, "missing"))
+
+    single = list(render_regions(*tables, regions, "ansi", max_workers=1, width=60))
+    pooled = list(render_regions(*tables, regions, "ansi", max_workers=2, width=60))
+
+    assert [region for region, _ in pooled] == regions
+    assert [result for _, result in pooled][:-1] == [result for _, result in single][:-1]
+    assert isinstance(pooled[-1][1], UnknownLocus)
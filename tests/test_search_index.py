@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from feature_store import compact_feature_columns
+from search_index import QualifierIndex
+
+
+@pytest.fixture
+def index():
+    loci = ["A", "A", "B", "C", "C", "C", "B"]
+    products = ["kinase", "permease", "kinase", "kinase", "ligase", "kinase", "kinase"]
+    return QualifierIndex(compact_feature_columns(pd.DataFrame({
+        "feature_type": "CDS",
+        "locus": loci,
+        "start": range(len(loci)),
+        "end": range(1, len(loci) + 1),
+        "strand": 1,
+        "qualifiers": [f"locus_tag=T{i}\nproduct={product}" for i, product in enumerate(products)],
+    })))
+
+
+def test_search_by_locus_follows_the_given_loci(index):
+    batches = list(index.iter_search_by_locus("kinase", loci=["C", "A", "missing"], batch_size=1))
+
+    assert [(locus, matches.index.tolist()) for locus, matches in batches] == [("C", [3]), ("C", [5]), ("A", [0])]
+
+
+def test_search_by_locus_matches_flat_search(index):
+    by_locus = index.search_by_locus("kinase")
+
+    assert list(by_locus) == ["A", "B", "C"]
+    assert {locus: matches.index.tolist() for locus, matches in by_locus.items()} == {"A": [0], "B": [2, 6], "C": [3, 5]}
+    assert sorted(pd.concat(by_locus.values()).index) == index.search("kinase").index.tolist()
+    assert index.search_by_locus("product:nothing") == {}